@@ -0,0 +1,92 @@
+import asyncio
+import json
+import random
+from collections import Counter
+
+import tornado.httpserver
+import tornado.web
+
+
+class FakeOpenRouter:
+    """Local stand-in for the OpenRouter chat/completions endpoint.
+
+    `latency` is the time before the first byte, `token_delay` the gap between
+    streamed tokens, and `error_rate` the share of requests answered with
+    `error_status` (429 responses carry a Retry-After header).
+    """
+
+    def __init__(self, latency: float = 0.3, token_delay: float = 0.02, tokens: int = 40,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+
+    def reply_words(self, payload: dict) -> list:
+        prompt = payload["messages"][-1]["content"]
+        words = [f"w{i}" for i in range(self.tokens)]
+        return [prompt.split()[0] if prompt.split() else "ok"] + words
+
+    def reply_text(self, payload: dict) -> str:
+        try:
+            items = json.loads(payload["messages"][-1]["content"])
+        except ValueError:
+            items = None
+        if isinstance(items, list):
+            return json.dumps([f"{item} w0 w1 w2" for item in items])
+        return " ".join(self.reply_words(payload))
+
+    def app(self):
+        return tornado.web.Application([(r"/api/v1/chat/completions", CompletionsHandler, {"fake": self})])
+
+    def start(self, port: int, listen: str = "127.0.0.1"):
+        self._server = tornado.httpserver.HTTPServer(self.app())
+        self._server.listen(port, address=listen)
+        return f"http://{listen}:{port}/api/v1/chat/completions"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop()
+
+
+class CompletionsHandler(tornado.web.RequestHandler):
+    def initialize(self, fake: FakeOpenRouter):
+        self.fake = fake
+
+    async def post(self):
+        fake = self.fake
+        payload = json.loads(self.request.body)
+        fake.calls[payload.get("model", "")] += 1
+        fake.in_flight += 1
+        fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+        try:
+            await asyncio.sleep(fake.latency)
+            if fake.random.random() < fake.error_rate:
+                fake.errors += 1
+                self.set_status(fake.error_status)
+                if fake.error_status == 429:
+                    self.set_header("Retry-After", "1")
+                self.write({"error": {"message": "injected failure"}})
+                return
+            words = fake.reply_words(payload)
+            usage = {"prompt_tokens": len(json.dumps(payload["messages"])) // 4, "completion_tokens": len(words)}
+            if not payload.get("stream"):
+                self.write({"choices": [{"message": {"content": fake.reply_text(payload)}}], "usage": usage})
+                return
+            self.set_header("Content-Type", "text/event-stream")
+            for word in words:
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                self.write(f"data: {json.dumps(chunk)}\n\n")
+                await self.flush()
+                await asyncio.sleep(fake.token_delay)
+            self.write(f"data: {json.dumps({'choices': [{'delta': {}}], 'usage': usage})}\n\n")
+            self.write("data: [DONE]\n\n")
+        finally:
+            fake.in_flight -= 1
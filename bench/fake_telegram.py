@@ -0,0 +1,82 @@
+import asyncio
+import datetime
+import itertools
+
+from telegram import Bot, Chat, Message, MessageEntity, Update, User
+from telegram.constants import MessageEntityType
+
+
+class FakeBot(Bot):
+    """Bot whose API calls never leave the process; sends and edits are counted."""
+
+    def __init__(self, latency: float = 0.05):
+        super().__init__("123456:BENCHMARK")
+        with self._unfrozen():
+            self.latency = latency
+            self.sent = 0
+            self.edits = 0
+            self._message_ids = itertools.count(1)
+            self._me = User(id=123456, first_name="AskzenBench", is_bot=True, username="askzen_bench_bot")
+
+    async def initialize(self):
+        with self._unfrozen():
+            self._bot_user = self._me
+            self._initialized = True
+
+    async def shutdown(self):
+        pass
+
+    async def get_me(self, *args, **kwargs):
+        return self._me
+
+    async def set_my_commands(self, commands, *args, **kwargs):
+        return True
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        with self._unfrozen():
+            self.sent += 1
+        return self._message(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        with self._unfrozen():
+            self.edits += 1
+        return self._message(chat_id, text, message_id)
+
+    def _message(self, chat_id, text, message_id=None):
+        message = Message(
+            message_id=message_id or next(self._message_ids),
+            date=datetime.datetime.now(datetime.timezone.utc),
+            chat=Chat(id=chat_id, type=Chat.PRIVATE),
+            text=text,
+            from_user=self._me,
+        )
+        message.set_bot(self)
+        return message
+
+
+class UpdateFactory:
+    def __init__(self, bot: FakeBot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def text(self, user_id: int, text: str, language_code: str = "en") -> Update:
+        user = User(id=user_id, first_name=f"user{user_id}", is_bot=False, language_code=language_code)
+        entities = []
+        if text.startswith("/"):
+            command = text.split()[0]
+            entities.append(MessageEntity(type=MessageEntityType.BOT_COMMAND, offset=0, length=len(command)))
+        message = Message(
+            message_id=next(self._message_ids),
+            date=datetime.datetime.now(datetime.timezone.utc),
+            chat=Chat(id=user_id, type=Chat.PRIVATE),
+            from_user=user,
+            text=text,
+            entities=entities,
+        )
+        update = Update(update_id=next(self._update_ids), message=message)
+        update.set_bot(self.bot)
+        message.set_bot(self.bot)
+        return update
@@ -0,0 +1,249 @@
+"""Offline load test for bot.py.
+
+Drives the real Application (handlers, scheduler, cache, storage) with
+synthetic updates against a local fake OpenRouter and a fake Telegram bot,
+then reports throughput, latency percentiles, memory growth and call counts.
+
+    python -m bench.run --rate 50 --duration 20 --users 200 --latency 0.4
+    python -m bench.run --mix chat=1 --error-rate 0.1 --error-status 429 --json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+DEFINE_WORDS = ["serendipity", "apple", "ephemeral", "run", "algorithm", "ubiquitous", "kitap", "love",
+                "gravity", "entropy", "resilience", "latency", "throughput", "cache", "quantum"]
+PHRASES = ["hello world", "good morning", "how are you", "where is the station", "thank you very much",
+           "iyi akşamlar", "see you tomorrow"]
+CHAT_LINES = ["What is the capital of France?", "Bana bir tavsiye ver", "Explain recursion briefly",
+              "How do I boil an egg?", "Tell me something interesting", "Bugün hava nasıl olacak?",
+              "Can you help me write an email?", "What did I just ask you?"]
+TOPICS = ["the sea", "a lost robot", "autumn", "a small cat", "the moon"]
+DEFAULT_MIX = "chat=5,define=2,translate=2,summary=1,story=1,poem=1,todo_add=1,help=1"
+
+first_reply = contextvars.ContextVar("first_reply", default=None)
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def parse_mix(text: str) -> list:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def make_text(command: str, rng: random.Random) -> str:
+    if command == "chat":
+        return rng.choice(CHAT_LINES)
+    if command == "define":
+        return f"/define {rng.choice(DEFINE_WORDS)}"
+    if command == "define_batch":
+        return "/define " + ", ".join(rng.sample(DEFINE_WORDS, 5))
+    if command == "translate":
+        return f"/translate {rng.choice(['tr', 'en', 'de'])} {rng.choice(PHRASES)}"
+    if command == "translate_batch":
+        return f"/translate {rng.choice(['tr', 'en', 'de'])}\n" + "\n".join(rng.sample(PHRASES, 4))
+    if command == "summary":
+        return "/summary " + " ".join(rng.choice(CHAT_LINES) for _ in range(8))
+    if command in ("story", "poem"):
+        return f"/{command} {rng.choice(TOPICS)}"
+    if command == "calc":
+        return f"/calc {rng.choice(['2+2*3', '(17-5)/4', '2**64', '9**9**9', '1/0'])}"
+    if command == "todo_add":
+        return f"/todo_add buy {rng.choice(DEFINE_WORDS)}"
+    return f"/{command}"
+
+
+def configure_env(args, workdir: str, upstream_url: str):
+    os.environ.update({
+        "OPENROUTER_API_KEY": "bench",
+        "TELEGRAM_BOT_TOKEN": "123456:BENCHMARK",
+        "OPENROUTER_URL": upstream_url,
+        "BOT_MODE": "polling",
+        "METRICS_PORT": "0",
+        "STORAGE_PATH": os.path.join(workdir, "askzen.db"),
+        "CACHE_PATH": os.path.join(workdir, "askzen_cache.db"),
+        "STREAM_REPLIES": "1" if args.stream else "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+
+async def run(args) -> dict:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from bench.fake_openrouter import FakeOpenRouter
+    from bench.fake_telegram import FakeBot, UpdateFactory
+
+    fake = FakeOpenRouter(args.latency, args.token_delay, args.tokens, args.error_rate, args.error_status, args.seed)
+    upstream_url = fake.start(args.port)
+    workdir = tempfile.mkdtemp(prefix="askzen-bench-")
+    configure_env(args, workdir, upstream_url)
+
+    from telegram.ext import ApplicationBuilder
+    import bot
+    import metrics
+
+    class TimedBot(FakeBot):
+        async def send_message(self, chat_id, text, *a, **kw):
+            message = await super().send_message(chat_id, text, *a, **kw)
+            marks = first_reply.get()
+            if marks is not None and "t" not in marks:
+                marks["t"] = time.perf_counter()
+            return message
+
+    fake_bot = TimedBot(args.telegram_latency)
+    app = bot.build_application(ApplicationBuilder().bot(fake_bot).updater(None))
+    await app.initialize()
+    await app.post_init(app)
+    factory = UpdateFactory(fake_bot)
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    names, weights = zip(*mix)
+
+    latencies = defaultdict(list)
+    first = defaultdict(list)
+    failures = defaultdict(int)
+
+    async def one(user_id: int, command: str):
+        update = factory.text(user_id, make_text(command, rng), rng.choice(["en", "tr"]))
+        marks = {}
+        first_reply.set(marks)
+        start = time.perf_counter()
+        try:
+            await app.process_update(update)
+        except Exception:
+            failures[command] += 1
+            return
+        latencies[command].append(time.perf_counter() - start)
+        if "t" in marks:
+            first[command].append(marks["t"] - start)
+
+    rss_before = rss_bytes()
+    total = int(args.rate * args.duration)
+    tasks = []
+    started = time.perf_counter()
+    next_at = started
+    for _ in range(total):
+        next_at += rng.expovariate(args.rate) if args.poisson else 1.0 / args.rate
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        command = rng.choices(names, weights)[0]
+        tasks.append(asyncio.create_task(one(rng.randint(1, args.users), command)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    rss_after = rss_bytes()
+
+    await app.shutdown()
+    await app.post_shutdown(app)
+    fake.stop()
+
+    commands = {}
+    for command in sorted(set(latencies) | set(failures)):
+        values = latencies[command]
+        commands[command] = {
+            "count": len(values),
+            "failures": failures[command],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "first_reply_p50_ms": round(percentile(first[command], 0.50) * 1000, 1),
+            "first_reply_p95_ms": round(percentile(first[command], 0.95) * 1000, 1),
+        }
+    completed = sum(len(v) for v in latencies.values())
+    return {
+        "requests": total,
+        "completed": completed,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(completed / elapsed, 1) if elapsed else 0.0,
+        "commands": commands,
+        "upstream_calls": dict(fake.calls),
+        "upstream_errors_injected": fake.errors,
+        "upstream_max_in_flight": fake.max_in_flight,
+        "telegram_sends": fake_bot.sent,
+        "telegram_edits": fake_bot.edits,
+        "cache": bot.response_cache.stats(),
+        "coalesced": bot.openrouter._inflight.coalesced + bot.completions.coalesced,
+        "scheduler_rejected": bot.scheduler.rejected,
+        "sessions": bot.sessions.memory_usage(),
+        "rss_growth_mb": round((rss_after - rss_before) / 2 ** 20, 2),
+        "metrics": metrics.REGISTRY.render() if args.dump_metrics else None,
+    }
+
+
+def print_report(report: dict):
+    print(f"requests={report['requests']} completed={report['completed']} elapsed={report['elapsed_s']}s "
+          f"throughput={report['throughput_rps']} req/s")
+    print(f"{'command':<12}{'n':>6}{'fail':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'first50':>10}{'first95':>10}")
+    for command, row in report["commands"].items():
+        print(f"{command:<12}{row['count']:>6}{row['failures']:>6}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+              f"{row['p99_ms']:>9}{row['first_reply_p50_ms']:>10}{row['first_reply_p95_ms']:>10}")
+    print(f"upstream calls={report['upstream_calls']} injected errors={report['upstream_errors_injected']} "
+          f"max in flight={report['upstream_max_in_flight']}")
+    print(f"telegram sends={report['telegram_sends']} edits={report['telegram_edits']}")
+    print(f"cache={report['cache']} coalesced={report['coalesced']} rejected={report['scheduler_rejected']}")
+    print(f"sessions={report['sessions']} rss growth={report['rss_growth_mb']} MB")
+    if report["metrics"]:
+        print(report["metrics"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for AskzenBot.")
+    parser.add_argument("--rate", type=float, default=20.0, help="updates per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--users", type=int, default=100, help="distinct user ids")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command weights, e.g. chat=5,define=2")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake OpenRouter time to first byte")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="delay between streamed tokens")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per fake completion")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status code for injected failures")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="fake Telegram API latency")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="disable streamed replies")
+    parser.add_argument("--port", type=int, default=18765, help="port for the fake OpenRouter")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for bot.py")
+    parser.add_argument("--dump-metrics", action="store_true", help="print the Prometheus metrics")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,36 @@
 import os
+import asyncio
+import json
 import logging
 import random
 import datetime
 from dotenv import load_dotenv
-from langdetect import detect, LangDetectException
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import (
     ApplicationBuilder,
-    CommandHandler,
     MessageHandler,
+    TypeHandler,
     ContextTypes,
     filters,
 )
-import httpx
+from cache import create_cache, make_key
+from calculator import evaluate
+from commands import CommandRegistry, text as message_text
+from cpu import CPUExecutor
+from language import LanguageDetector, preload as preload_language
+import metrics
+from openrouter import FALLBACK_MODELS, OPENROUTER_URL, OpenRouterClient, OpenRouterError
+from scheduler import FairScheduler, SchedulerBusy, Superseded
+from sender import Outbox
+from sharding import run_sharded
+from singleflight import SingleFlight
+from state import SessionStore
+from storage import SQLiteStorage
+from streaming import ProgressiveReply
+from tokens import history_budget
+from updates import PerUserUpdateProcessor
+from webhook import serve_webhook, start_metrics_server
 
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -22,11 +40,61 @@ if not OPENROUTER_API_KEY:
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN bulunamadı.")
 
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.getenv("CACHE_PATH", "askzen_cache.db")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "20000"))
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_EDIT_MIN_CHARS = int(os.getenv("STREAM_EDIT_MIN_CHARS", "30"))
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL bulunamadı.")
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("WEBHOOK_SECRET bulunamadı.")
+
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip().isdigit()}
+
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "256"))
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+LLM_USER_MAX_PENDING = int(os.getenv("LLM_USER_MAX_PENDING", "3"))
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "0.2"))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "5"))
+
 logging.basicConfig(level=logging.INFO)
-USER_HISTORY = {}
-USER_STATS = {}
-USER_LANG_PREF = {}
-USER_TODOS = {}
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "askzen.db")
+STORAGE_FLUSH_INTERVAL = float(os.getenv("STORAGE_FLUSH_INTERVAL", "5"))
+# SHARDS > 1 runs one routing front end plus N worker processes that share the SQLite store.
+# Each user is owned by exactly one process; do not run several bot instances on one database.
+# The Telegram send rates and the LLM caps above are for the whole bot: each shard gets 1/SHARDS.
+SHARDS = int(os.getenv("SHARDS", "1"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+CPU_TASK_TIMEOUT = float(os.getenv("CPU_TASK_TIMEOUT", "2.0"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "20"))
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "2048"))
+BATCH_PROMPT = (
+    "You will receive a JSON array of {count} inputs. Handle each input on its own as instructed above and "
+    "reply with only a JSON array of {count} strings: one answer per input, in the same order."
+)
+OPENROUTER_MODELS = [m.strip() for m in os.getenv("OPENROUTER_MODELS", ",".join(FALLBACK_MODELS)).split(",") if m.strip()]
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", str(history_budget(OPENROUTER_MODELS[0], 128))))
+HISTORY_SUMMARY = os.getenv("HISTORY_SUMMARY", "1") == "1"
+HISTORY_SUMMARY_PROMPT = (
+    "Summarize the conversation below in at most five sentences. Keep names, facts and "
+    "preferences the assistant should remember. Reply in the conversation's language."
+)
 JOKES = [
     "Geçen gün fırına gittim, ekmek küsmüş: 'Beni koy, koy, dedim koydum gelmedi.'",
     "Bilgisayarım öksürdü, virüs sandım, meğer tozmuş.",
@@ -42,409 +110,548 @@ FACTS = [
     "Dünya yüzeyinin %71’i sudur.",
     "Venüs, Güneş Sistemi'nde saat yönünde dönen tek gezegendir.",
 ]
-http_client = httpx.AsyncClient(timeout=15.0)
-
-def detect_language(text: str) -> str:
-    try:
-        code = detect(text)
-        return "tr" if code == "tr" else "en"
-    except LangDetectException:
-        return "en"
+# Built by bootstrap() rather than at import: child processes (shards, the
+# CPU pool's forkserver) re-import this module and must not open their own
+# stores, clients and connections.
+sessions = None
+openrouter = None
+outbox = None
+scheduler = None
+response_cache = None
+completions = None
+cpu_executor = None
+language_detector = None
+
+def bootstrap():
+    global sessions, openrouter, outbox, scheduler, response_cache, completions, cpu_executor, language_detector
+    if sessions is not None:
+        return
+    sessions = SessionStore(
+        max_users=int(os.getenv("SESSION_MAX_USERS", "10000")),
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", str(7 * 86400))),
+        history_budget=HISTORY_TOKEN_BUDGET,
+        storage=SQLiteStorage(STORAGE_PATH) if STORAGE_BACKEND == "sqlite" else None,
+    )
+    openrouter = OpenRouterClient(
+        OPENROUTER_API_KEY,
+        url=os.getenv("OPENROUTER_URL", OPENROUTER_URL),
+        max_connections=int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "50")),
+        max_keepalive=int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "20")),
+        models=OPENROUTER_MODELS,
+        max_retries=int(os.getenv("OPENROUTER_MAX_RETRIES", "2")),
+        hedge_delay=float(os.getenv("OPENROUTER_HEDGE_DELAY", "3.0")),
+    )
+    # Shard workers split the bot-wide limits evenly. A group's members can
+    # be spread over every shard, so per-group pacing is split too.
+    shards = SHARDS if BOT_MODE == "shard" else 1
+    outbox = Outbox(global_rate=TELEGRAM_GLOBAL_RATE / shards, group_rate=TELEGRAM_GROUP_RATE / shards)
+    scheduler = FairScheduler(max(1, LLM_MAX_CONCURRENT // shards), max(1, LLM_MAX_QUEUE // shards),
+                              LLM_USER_MAX_PENDING, LLM_USER_RATE, LLM_USER_BURST)
+    response_cache = create_cache(CACHE_BACKEND, CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_TTL)
+    completions = SingleFlight()
+    cpu_executor = CPUExecutor(CPU_WORKERS, CPU_TASK_TIMEOUT, initializer=preload_language)
+    language_detector = LanguageDetector()
+
+    metrics.ACTIVE_USERS.set_function(lambda: {
+        ("5m",): sessions.active_users(300),
+        ("1h",): sessions.active_users(3600),
+        ("resident",): len(sessions),
+    })
+    metrics.CACHE_EVENTS.set_function(lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses})
+
+async def detect_language(text: str) -> str:
+    with metrics.LANGDETECT_LATENCY.time():
+        return await language_detector.detect_async(text, cpu_executor)
+
+def busy_text(lang_code: str) -> str:
+    return message_text("busy", lang_code)
 
 def get_system_prompt(lang_code: str) -> str:
-    return "Sen yardımcı bir asistansın. Kullanıcının dilinde yanıt ver." if lang_code == "tr" \
-        else "You are a helpful assistant. Reply in the user's language."
+    return message_text("system_prompt", lang_code)
+
+SUMMARY_BACKLOG = {}
+SUMMARY_TASKS = {}
 
 def add_to_history(user_id: int, role: str, content: str):
-    history = USER_HISTORY.setdefault(user_id, [])
-    history.append({"role": role, "content": content})
-    if len(history) > 6:
-        del history[0]
+    dropped = sessions.add_history(user_id, role, content)
+    if dropped and HISTORY_SUMMARY:
+        if user_id in SUMMARY_BACKLOG:
+            SUMMARY_BACKLOG[user_id].extend(dropped)
+        else:
+            SUMMARY_BACKLOG[user_id] = dropped
+            SUMMARY_TASKS[user_id] = asyncio.get_running_loop().create_task(summarize_history(user_id))
+
+def cancel_summary(user_id: int):
+    """Forget queued turns and stop an in-flight summary so it cannot restore cleared history."""
+    SUMMARY_BACKLOG.pop(user_id, None)
+    task = SUMMARY_TASKS.pop(user_id, None)
+    if task is not None:
+        task.cancel()
+
+async def summarize_history(user_id: int):
+    try:
+        while SUMMARY_BACKLOG.get(user_id):
+            turns = SUMMARY_BACKLOG[user_id]
+            SUMMARY_BACKLOG[user_id] = []
+            previous = sessions.summary(user_id)
+            text = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+            if previous:
+                text = f"Earlier summary: {previous}\n\n{text}"
+            messages = [{"role":"system","content":HISTORY_SUMMARY_PROMPT},{"role":"user","content":text}]
+            async with scheduler.slot(user_id, "history_summary", background=True):
+                summary = await openrouter.complete("history_summary", messages, max_tokens=160, temperature=0.2)
+            sessions.set_summary(user_id, summary.strip())
+    except Exception as e:
+        logging.warning(f"History summary failed: {e}")
+    finally:
+        if SUMMARY_TASKS.get(user_id) is asyncio.current_task():
+            SUMMARY_TASKS.pop(user_id)
+            SUMMARY_BACKLOG.pop(user_id, None)
+
+async def cached_completion(user_id: int, command: str, system_prompt: str, text: str, max_tokens: int,
+                            temperature: float, target: str = "", model: str = None) -> str:
+    """Answer from the response cache, else from one upstream call per key.
+
+    Identical requests in flight share one call and one scheduler slot, and
+    the cache is checked again once the slot is granted, since an earlier
+    call may have filled it while this one waited.
+    """
+    key = make_key(command, model or OPENROUTER_MODELS[0], system_prompt, text, target)
+    reply = await response_cache.get(key)
+    if reply is None:
+        messages = [{"role":"system","content":system_prompt},{"role":"user","content":text}]
+        reply = await completions.do(key, fill_completion, user_id, command, key, messages, max_tokens,
+                                     temperature, model)
+    return reply
+
+async def fill_completion(user_id: int, command: str, key: str, messages: list, max_tokens: int,
+                          temperature: float, model: str = None) -> str:
+    async with scheduler.slot(user_id, command):
+        reply = await response_cache.get(key, recheck=True)
+        if reply is not None:
+            return reply
+        reply = await openrouter.complete(command, messages, max_tokens=max_tokens, temperature=temperature, model=model)
+    await response_cache.set(key, reply)
+    return reply
+
+def parse_batch(reply: str, count: int):
+    start, end = reply.find("["), reply.rfind("]")
+    if start < 0 or end < start:
+        return None
+    try:
+        answers = json.loads(reply[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [str(answer).strip() for answer in answers]
+
+async def complete_chunk(command, system_prompt: str, items: list) -> list:
+    """Answer `items` with one JSON-array request, or one request per item if its reply is unusable."""
+    if len(items) > 1:
+        messages = [{"role":"system","content":f"{system_prompt}\n\n{BATCH_PROMPT.format(count=len(items))}"},
+                    {"role":"user","content":json.dumps(items, ensure_ascii=False)}]
+        reply = await openrouter.complete(command.name, messages, max_tokens=command.max_tokens * len(items),
+                                          temperature=command.temperature, model=command.model)
+        parsed = parse_batch(reply, len(items))
+        if parsed is not None:
+            return parsed
+        logging.warning(f"Unparseable {command.name} batch reply, falling back to one request per item")
+    # One at a time: the caller's slot stands for a single upstream request.
+    answers = []
+    for item in items:
+        messages = [{"role":"system","content":system_prompt},{"role":"user","content":item}]
+        answers.append(await openrouter.complete(command.name, messages, max_tokens=command.max_tokens,
+                                                 temperature=command.temperature, model=command.model))
+    return answers
+
+async def batch_completion(user_id: int, command, system_prompt: str, items: list, target: str = "") -> list:
+    """Answer several items of one command with as few upstream calls as possible.
+
+    Items already in the response cache are served from it, and items that
+    another request is already fetching join that call (single and batch
+    requests share cache keys). The rest go out as JSON-array requests,
+    split so each stays within BATCH_MAX_TOKENS and each holding its own
+    scheduler slot, and are cached under their single-item keys.
+    """
+    keys = [make_key(command.name, command.model or OPENROUTER_MODELS[0], system_prompt, item, target) for item in items]
+    answers = list(await asyncio.gather(*(response_cache.get(key) for key in keys)))
+    missing = [i for i, answer in enumerate(answers) if answer is None]
+    if missing:
+        pending = {keys[i]: items[i] for i in missing}
+        filled = await completions.do_many(list(pending), fill_batch, user_id, command, system_prompt, pending)
+        for i, answer in zip(missing, filled):
+            answers[i] = answer
+    return answers
+
+async def fill_batch(keys: list, user_id: int, command, system_prompt: str, items: dict) -> list:
+    size = max(1, BATCH_MAX_TOKENS // command.max_tokens)
+    chunks = [keys[n:n + size] for n in range(0, len(keys), size)]
+    filled = await asyncio.gather(*(fill_chunk(user_id, command, system_prompt, chunk, items) for chunk in chunks))
+    return [answer for answers in filled for answer in answers]
+
+async def fill_chunk(user_id: int, command, system_prompt: str, keys: list, items: dict) -> list:
+    async with scheduler.slot(user_id, command.name):
+        answers = list(await asyncio.gather(*(response_cache.get(key, recheck=True) for key in keys)))
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        if missing:
+            fresh = await complete_chunk(command, system_prompt, [items[keys[i]] for i in missing])
+            for i, answer in zip(missing, fresh):
+                answers[i] = answer
+    await asyncio.gather(*(response_cache.set(keys[i], answers[i]) for i in missing))
+    return answers
+
+def format_batch(items: list, answers: list) -> str:
+    blocks = []
+    for n, (item, answer) in enumerate(zip(items, answers), 1):
+        label = item if len(item) <= 60 else item[:57] + "..."
+        blocks.append(f"{n}. {label}\n{answer}")
+    return "\n\n".join(blocks)
 
 def increment_stat(user_id: int):
-    USER_STATS[user_id] = USER_STATS.get(user_id, 0) + 1
+    sessions.increment_stat(user_id)
+
+COMMANDS = CommandRegistry()
 
+async def run_llm_command(update: Update, context: ContextTypes.DEFAULT_TYPE, command):
+    user_id = update.effective_user.id
+    lang = sessions.lang(user_id)
+    args = context.args
+    if len(args) <= len(command.params):
+        await outbox.reply(update.message, command.usage(lang))
+        return
+    params = dict(zip(command.params, args))
+    text = " ".join(args[len(command.params):])
+    system_prompt = command.prompt.format(**params)
+    items = [text]
+    if command.batch is not None:
+        parts = update.message.text.split(None, len(command.params) + 1)
+        items = command.split(parts[-1])
+    if len(items) > BATCH_MAX_ITEMS:
+        await outbox.reply(update.message, command.text("batch_limit", lang, limit=BATCH_MAX_ITEMS))
+        return
+    messages = [{"role":"system","content":system_prompt},{"role":"user","content":text}]
+    progress = None
+    if command.stream and STREAM_REPLIES:
+        progress = ProgressiveReply(update.message, outbox, STREAM_EDIT_INTERVAL, STREAM_EDIT_MIN_CHARS)
+    fail = progress.fail if progress else lambda msg: outbox.reply(update.message, msg)
+    try:
+        if len(items) > 1:
+            answers = await batch_completion(user_id, command, system_prompt, items, target=" ".join(params.values()))
+            await outbox.reply(update.message, format_batch(items, answers))
+            return
+        if progress:
+            async with scheduler.slot(user_id, command.name):
+                await progress.consume(openrouter.stream(command.name, messages, max_tokens=command.max_tokens,
+                                                         temperature=command.temperature, model=command.model))
+            return
+        if command.cached:
+            reply = await cached_completion(user_id, command.name, system_prompt, text, command.max_tokens,
+                                            command.temperature, target=" ".join(params.values()), model=command.model)
+        else:
+            async with scheduler.slot(user_id, command.name):
+                reply = await openrouter.complete(command.name, messages, max_tokens=command.max_tokens,
+                                                  temperature=command.temperature, model=command.model)
+        await outbox.reply(update.message, reply)
+    except SchedulerBusy:
+        await fail(busy_text(lang))
+    except OpenRouterError as e:
+        await fail(str(e))
+    except Exception:
+        await fail(command.error[lang])
+
+@COMMANDS.command("start", hidden=True, messages={
+    "welcome": {"tr": "👋 Merhaba! AskzenBot'a hoş geldin. Komut listesi için /help yazabilirsin.",
+                "en": "👋 Hello! Welcome to AskzenBot. Type /help for commands."},
+})
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     lang = update.effective_user.language_code or "en"
-    USER_LANG_PREF[user_id] = "tr" if lang.startswith("tr") else "en"
-    text = "👋 Merhaba! AskzenBot'a hoş geldin. Komut listesi için /help yazabilirsin." \
-        if USER_LANG_PREF[user_id] == "tr" \
-        else "👋 Hello! Welcome to AskzenBot. Type /help for commands."
-    await update.message.reply_text(text)
+    lang = "tr" if lang.startswith("tr") else "en"
+    sessions.set_lang(user_id, lang)
+    await outbox.reply(update.message, COMMANDS["start"].text("welcome", lang))
 
+@COMMANDS.command("help", help_tr="Komut listesi", help_en="Show commands")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    lang = USER_LANG_PREF.get(user_id, "en")
-    if lang == "tr":
-        text = (
-            "/help - Komut listesi\n"
-            "/lang <tr|en> - Dil tercihini değiştir\n"
-            "/reset - Sohbet geçmişini temizle\n"
-            "/stats - İstek istatistiklerini göster\n"
-            "/joke - Rastgele şaka\n"
-            "/quote - Rastgele alıntı\n"
-            "/fact - Rastgele bilgi\n"
-            "/translate <hedef_dil> <metin> - Metni çevir\n"
-            "/summary <metin> - Metni özetle\n"
-            "/define <kelime> - Kelime tanımı yap\n"
-            "/todo_add <madde> - Yapılacak ekle\n"
-            "/todo_list - Yapılacak liste\n"
-            "/todo_clear - Yapılacak temizle\n"
-            "/ping - Gecikmeyi ölç\n"
-            "/time - Mevcut zamanı göster\n"
-            "/roll <sayi> - 1 ila sayı arasında rastgele sayı\n"
-            "/flip - Yazı-tura at\n"
-            "/calc <ifade> - Matematik hesaplama\n"
-            "/echo <metin> - Yazılanı tekrar yazar\n"
-            "/about - Bot hakkında bilgi\n"
-            "/user - Kullanıcı bilgilerini göster\n"
-            "/random <min> <max> - Rastgele sayı üret\n"
-            "/poem <konu> - Konuya şiir oluştur\n"
-            "/story <konu> - Konuya hikaye oluştur\n"
-        )
-    else:
-        text = (
-            "/help - Show commands\n"
-            "/lang <tr|en> - Change language\n"
-            "/reset - Clear history\n"
-            "/stats - Show usage stats\n"
-            "/joke - Get random joke\n"
-            "/quote - Get random quote\n"
-            "/fact - Get random fact\n"
-            "/translate <target_lang> <text> - Translate text\n"
-            "/summary <text> - Summarize text\n"
-            "/define <word> - Define a word\n"
-            "/todo_add <item> - Add to to-do list\n"
-            "/todo_list - Show to-do list\n"
-            "/todo_clear - Clear to-do list\n"
-            "/ping - Measure latency\n"
-            "/time - Show current time\n"
-            "/roll <number> - Roll a number\n"
-            "/flip - Flip a coin\n"
-            "/calc <expression> - Math calculate\n"
-            "/echo <text> - Echo text\n"
-            "/about - About this bot\n"
-            "/user - Show user info\n"
-            "/random <min> <max> - Generate random number\n"
-            "/poem <topic> - Create poem\n"
-            "/story <topic> - Create story\n"
-        )
-    await update.message.reply_text(text)
+    lang = sessions.lang(update.effective_user.id)
+    await outbox.reply(update.message, COMMANDS.help_text(lang))
 
+@COMMANDS.command("lang", help_tr="Dil tercihini değiştir", help_en="Change language", args_tr="<tr|en>", args_en="<tr|en>",
+                  messages={"set": {"tr": "Dil tercihin Türkçe olarak ayarlandı.", "en": "Language set to English."}})
 async def lang_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     args = context.args
     if args and args[0].lower() in ("tr", "en"):
-        USER_LANG_PREF[user_id] = args[0].lower()
-        msg = "Dil tercihin Türkçe olarak ayarlandı." if args[0].lower()=="tr" else "Language set to English."
-        await update.message.reply_text(msg)
+        lang = args[0].lower()
+        sessions.set_lang(user_id, lang)
+        await outbox.reply(update.message, COMMANDS["lang"].text("set", lang))
     else:
-        lang = USER_LANG_PREF.get(user_id,"en")
-        err = "Kullanım: /lang <tr|en>" if lang=="tr" else "Usage: /lang <tr|en>"
-        await update.message.reply_text(err)
+        lang = sessions.lang(user_id)
+        await outbox.reply(update.message, COMMANDS["lang"].usage(lang))
 
+@COMMANDS.command("reset", help_tr="Sohbet geçmişini temizle", help_en="Clear history",
+                  messages={"done": {"tr": "Sohbet geçmişi temizlendi.", "en": "Conversation history cleared."}})
 async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    USER_HISTORY[user_id] = []
-    lang = USER_LANG_PREF.get(user_id, "en")
-    msg = "Sohbet geçmişi temizlendi." if lang=="tr" else "Conversation history cleared."
-    await update.message.reply_text(msg)
+    cancel_summary(user_id)
+    sessions.clear_history(user_id)
+    lang = sessions.lang(user_id)
+    await outbox.reply(update.message, COMMANDS["reset"].text("done", lang))
 
+@COMMANDS.command("stats", help_tr="İstek istatistiklerini göster", help_en="Show usage stats",
+                  messages={"count": {"tr": "Toplam {count} istek gönderdiniz.", "en": "You have sent {count} requests."}})
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    count = USER_STATS.get(user_id, 0)
-    lang = USER_LANG_PREF.get(user_id,"en")
-    msg = f"Toplam {count} istek gönderdiniz." if lang=="tr" else f"You have sent {count} requests."
-    await update.message.reply_text(msg)
+    count = sessions.stats(user_id)
+    lang = sessions.lang(user_id)
+    await outbox.reply(update.message, COMMANDS["stats"].text("count", lang, count=count))
 
+@COMMANDS.command("joke", help_tr="Rastgele şaka", help_en="Get random joke")
 async def joke_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(random.choice(JOKES))
+    await outbox.reply(update.message, random.choice(JOKES))
 
+@COMMANDS.command("quote", help_tr="Rastgele alıntı", help_en="Get random quote")
 async def quote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(random.choice(QUOTES))
+    await outbox.reply(update.message, random.choice(QUOTES))
 
+@COMMANDS.command("fact", help_tr="Rastgele bilgi", help_en="Get random fact")
 async def fact_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(random.choice(FACTS))
-
-async def translate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    args = context.args
-    lang = USER_LANG_PREF.get(user_id, "en")
-    if len(args) < 2:
-        err = "Kullanım: /translate <hedef_dil> <metin>" if lang=="tr" else "Usage: /translate <target_lang> <text>"
-        await update.message.reply_text(err)
-        return
-    target = args[0]
-    text_to_translate = " ".join(args[1:])
-    system_prompt = f"You are a translator. Translate to {target}."
-    payload = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": [{"role":"system","content":system_prompt},{"role":"user","content":text_to_translate}],
-        "max_tokens":256,"temperature":0.2
-    }
-    headers = {"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
-    try:
-        r = await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data = r.json()
-        reply = data["choices"][0]["message"]["content"] if r.status_code==200 else data.get("error",{}).get("message","Hata")
-        await update.message.reply_text(reply)
-    except Exception:
-        err = "❌ Çeviri yapılamadı." if lang=="tr" else "❌ Translation failed."
-        await update.message.reply_text(err)
-
-async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    text = " ".join(context.args)
-    lang = USER_LANG_PREF.get(user_id,"en")
-    if not text:
-        err = "Kullanım: /summary <metin>" if lang=="tr" else "Usage: /summary <text>"
-        await update.message.reply_text(err)
-        return
-    system_prompt = "You are a summarizer. Summarize the following text."
-    payload = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages":[{"role":"system","content":system_prompt},{"role":"user","content":text}],
-        "max_tokens":128,"temperature":0.2
-    }
-    headers={"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
-    try:
-        r=await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data=r.json()
-        reply=data["choices"][0]["message"]["content"] if r.status_code==200 else data.get("error",{}).get("message","Hata")
-        await update.message.reply_text(reply)
-    except Exception:
-        err="❌ Özet alınamadı." if lang=="tr" else "❌ Summarization failed."
-        await update.message.reply_text(err)
-
-async def define_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    word = " ".join(context.args)
-    lang = USER_LANG_PREF.get(user_id,"en")
-    if not word:
-        err = "Kullanım: /define <kelime>" if lang=="tr" else "Usage: /define <word>"
-        await update.message.reply_text(err)
-        return
-    system_prompt = "You are a dictionary. Provide a clear definition."
-    payload = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages":[{"role":"system","content":system_prompt},{"role":"user","content":word}],
-        "max_tokens":64,"temperature":0.2
-    }
-    headers={"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
-    try:
-        r=await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data=r.json()
-        reply=data["choices"][0]["message"]["content"] if r.status_code==200 else data.get("error",{}).get("message","Hata")
-        await update.message.reply_text(reply)
-    except Exception:
-        err="❌ Tanım bulunamadı." if lang=="tr" else "❌ Definition failed."
-        await update.message.reply_text(err)
-
+    await outbox.reply(update.message, random.choice(FACTS))
+
+COMMANDS.llm("translate", "You are a translator. Translate to {target}.", params=("target",),
+             help_tr="Metni çevir", help_en="Translate text", args_tr="<hedef_dil> <metin>", args_en="<target_lang> <text>",
+             max_tokens=256, temperature=0.2, cached=True, batch=r"\n+", error_tr="❌ Çeviri yapılamadı.", error_en="❌ Translation failed.")
+COMMANDS.llm("summary", "You are a summarizer. Summarize the following text.",
+             help_tr="Metni özetle", help_en="Summarize text", args_tr="<metin>", args_en="<text>",
+             max_tokens=128, temperature=0.2, cached=True, batch=r"\n\s*-{3,}\s*\n", error_tr="❌ Özet alınamadı.", error_en="❌ Summarization failed.")
+COMMANDS.llm("define", "You are a dictionary. Provide a clear definition.",
+             help_tr="Kelime tanımı yap", help_en="Define a word", args_tr="<kelime>", args_en="<word>",
+             max_tokens=64, temperature=0.2, cached=True, batch=r"[,\n]+", error_tr="❌ Tanım bulunamadı.", error_en="❌ Definition failed.")
+
+@COMMANDS.command("todo_add", help_tr="Yapılacak ekle", help_en="Add to to-do list", args_tr="<madde>", args_en="<item>",
+                  messages={"added": {"tr": "Listeye eklendi.", "en": "Added to to-do list."}})
 async def todo_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     item = " ".join(context.args)
-    lang = USER_LANG_PREF.get(user_id,"en")
+    lang = sessions.lang(user_id)
     if not item:
-        err = "Kullanım: /todo_add <madde>" if lang=="tr" else "Usage: /todo_add <item>"
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, COMMANDS["todo_add"].usage(lang))
         return
-    USER_TODOS.setdefault(user_id,[]).append(item)
-    msg="Listeye eklendi." if lang=="tr" else "Added to to-do list."
-    await update.message.reply_text(msg)
+    sessions.add_todo(user_id,item)
+    await outbox.reply(update.message, COMMANDS["todo_add"].text("added", lang))
 
+@COMMANDS.command("todo_list", help_tr="Yapılacak liste", help_en="Show to-do list",
+                  messages={"empty": {"tr": "Yapılacak listeniz boş.", "en": "Your to-do list is empty."}})
 async def todo_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    lang = USER_LANG_PREF.get(user_id,"en")
-    todos = USER_TODOS.get(user_id,[])
+    lang = sessions.lang(user_id)
+    todos = sessions.todos(user_id)
     if not todos:
-        msg="Yapılacak listeniz boş." if lang=="tr" else "Your to-do list is empty."
-        await update.message.reply_text(msg)
+        await outbox.reply(update.message, COMMANDS["todo_list"].text("empty", lang))
         return
     text="\n".join(f"{i+1}. {item}" for i,item in enumerate(todos))
-    await update.message.reply_text(text)
+    await outbox.reply(update.message, text)
 
+@COMMANDS.command("todo_clear", help_tr="Yapılacak temizle", help_en="Clear to-do list",
+                  messages={"done": {"tr": "Yapılacak liste temizlendi.", "en": "To-do list cleared."}})
 async def todo_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    lang = USER_LANG_PREF.get(user_id,"en")
-    USER_TODOS[user_id]=[]
-    msg="Yapılacak liste temizlendi." if lang=="tr" else "To-do list cleared."
-    await update.message.reply_text(msg)
+    lang = sessions.lang(user_id)
+    sessions.clear_todos(user_id)
+    await outbox.reply(update.message, COMMANDS["todo_clear"].text("done", lang))
 
+@COMMANDS.command("ping", help_tr="Gecikmeyi ölç", help_en="Measure latency")
 async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     start_time=datetime.datetime.now()
-    message=await update.message.reply_text("Pong...")
+    message=await outbox.reply(update.message,"Pong...",mergeable=False)
     latency=(datetime.datetime.now()-start_time).total_seconds()*1000
-    await message.edit_text(f"Pong! {int(latency)} ms")
+    await outbox.edit(message, f"Pong! {int(latency)} ms")
 
+@COMMANDS.command("time", help_tr="Mevcut zamanı göster", help_en="Show current time",
+                  messages={"now": {"tr": "Şu anki zaman: {now}", "en": "Current time: {now}"}})
 async def time_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
+    lang=sessions.lang(user_id)
     now=datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    msg=f"Şu anki zaman: {now}" if lang=="tr" else f"Current time: {now}"
-    await update.message.reply_text(msg)
+    await outbox.reply(update.message, COMMANDS["time"].text("now", lang, now=now))
 
+@COMMANDS.command("roll", help_tr="1 ila sayı arasında rastgele sayı", help_en="Roll a number", args_tr="<sayi>", args_en="<number>")
 async def roll_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
+    lang=sessions.lang(user_id)
     args=context.args
     if not args or not args[0].isdigit():
-        err="Kullanım: /roll <sayi>" if lang=="tr" else "Usage: /roll <number>"
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, COMMANDS["roll"].usage(lang))
         return
     n=int(args[0])
     result=random.randint(1, max(1,n))
-    await update.message.reply_text(str(result))
+    await outbox.reply(update.message, str(result))
 
+@COMMANDS.command("flip", help_tr="Yazı-tura at", help_en="Flip a coin",
+                  messages={"heads": {"tr": "Yazı", "en": "Heads"}, "tails": {"tr": "Tura", "en": "Tails"}})
 async def flip_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
-    result=random.choice(["Yazı","Tura"]) if lang=="tr" else random.choice(["Heads","Tails"])
-    await update.message.reply_text(result)
+    lang=sessions.lang(user_id)
+    await outbox.reply(update.message, COMMANDS["flip"].text(random.choice(("heads", "tails")), lang))
 
+@COMMANDS.command("calc", help_tr="Matematik hesaplama", help_en="Math calculate", args_tr="<ifade>", args_en="<expression>",
+                  messages={"invalid": {"tr": "❌ Geçersiz ifade.", "en": "❌ Invalid expression."}})
 async def calc_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
+    lang=sessions.lang(user_id)
     expr=" ".join(context.args)
     if not expr:
-        err="Kullanım: /calc <ifade>" if lang=="tr" else "Usage: /calc <expression>"
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, COMMANDS["calc"].usage(lang))
         return
     try:
-        allowed="0123456789+-*/(). "
-        if any(ch not in allowed for ch in expr):
-            raise ValueError
-        result=eval(expr)
-        await update.message.reply_text(str(result))
+        result=await cpu_executor.run(evaluate, expr)
+        await outbox.reply(update.message, str(result))
     except Exception:
-        err="❌ Geçersiz ifade." if lang=="tr" else "❌ Invalid expression."
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, COMMANDS["calc"].text("invalid", lang))
 
+@COMMANDS.command("echo", help_tr="Yazılanı tekrar yazar", help_en="Echo text", args_tr="<metin>", args_en="<text>")
 async def echo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text=" ".join(context.args)
     if text:
-        await update.message.reply_text(text)
+        await outbox.reply(update.message, text)
 
+@COMMANDS.command("about", help_tr="Bot hakkında bilgi", help_en="About this bot", messages={
+    "about": {"tr": "AskzenBot v1.1 - Ücretsiz OpenRouter AI destekli, hızlı ve çok özellikli bir Telegram botudur.",
+              "en": "AskzenBot v1.1 - A fast, multi-feature Telegram bot powered by free OpenRouter AI."},
+})
 async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
-    msg="AskzenBot v1.1 - Ücretsiz OpenRouter AI destekli, hızlı ve çok özellikli bir Telegram botudur." \
-        if lang=="tr" \
-        else "AskzenBot v1.1 - A fast, multi-feature Telegram bot powered by free OpenRouter AI."
-    await update.message.reply_text(msg)
+    lang=sessions.lang(user_id)
+    await outbox.reply(update.message, COMMANDS["about"].text("about", lang))
 
+@COMMANDS.command("user", help_tr="Kullanıcı bilgilerini göster", help_en="Show user info")
 async def user_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user=update.effective_user
     text=f"ID: {user.id}\nAd: {user.full_name}\nKullanıcı adı: @{user.username or 'yok'}"
-    await update.message.reply_text(text)
+    await outbox.reply(update.message, text)
 
+@COMMANDS.command("random", help_tr="Rastgele sayı üret", help_en="Generate random number", args_tr="<min> <max>", args_en="<min> <max>")
 async def random_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
-    lang=USER_LANG_PREF.get(user_id,"en")
+    lang=sessions.lang(user_id)
     args=context.args
     if len(args)<2 or not args[0].isdigit() or not args[1].isdigit():
-        err="Kullanım: /random <min> <max>" if lang=="tr" else "Usage: /random <min> <max>"
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, COMMANDS["random"].usage(lang))
         return
     mn, mx=int(args[0]), int(args[1])
     if mn>mx: mn, mx = mx, mn
-    await update.message.reply_text(str(random.randint(mn,mx)))
-
-async def poem_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id=update.effective_user.id
-    topic=" ".join(context.args)
-    lang=USER_LANG_PREF.get(user_id,"en")
-    if not topic:
-        err="Kullanım: /poem <konu>" if lang=="tr" else "Usage: /poem <topic>"
-        await update.message.reply_text(err)
-        return
-    system_prompt="You are a poet. Write a short poem about the topic."
-    payload={"model":"mistralai/mistral-7b-instruct","messages":[{"role":"system","content":system_prompt},{"role":"user","content":topic}],"max_tokens":128,"temperature":0.7}
-    headers={"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
-    try:
-        r=await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data=r.json()
-        reply=data["choices"][0]["message"]["content"] if r.status_code==200 else data.get("error",{}).get("message","Hata")
-        await update.message.reply_text(reply)
-    except Exception:
-        err="❌ Şiir oluşturulamadı." if lang=="tr" else "❌ Could not generate poem."
-        await update.message.reply_text(err)
+    await outbox.reply(update.message, str(random.randint(mn,mx)))
 
-async def story_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id=update.effective_user.id
-    topic=" ".join(context.args)
-    lang=USER_LANG_PREF.get(user_id,"en")
-    if not topic:
-        err="Kullanım: /story <konu>" if lang=="tr" else "Usage: /story <topic>"
-        await update.message.reply_text(err)
-        return
-    system_prompt="You are a storyteller. Write a short story about the topic."
-    payload={"model":"mistralai/mistral-7b-instruct","messages":[{"role":"system","content":system_prompt},{"role":"user","content":topic}],"max_tokens":256,"temperature":0.7}
-    headers={"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
-    try:
-        r=await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data=r.json()
-        reply=data["choices"][0]["message"]["content"] if r.status_code==200 else data.get("error",{}).get("message","Hata")
-        await update.message.reply_text(reply)
-    except Exception:
-        err="❌ Hikaye oluşturulamadı." if lang=="tr" else "❌ Could not generate story."
-        await update.message.reply_text(err)
+COMMANDS.llm("poem", "You are a poet. Write a short poem about the topic.",
+             help_tr="Konuya şiir oluştur", help_en="Create poem", args_tr="<konu>", args_en="<topic>",
+             max_tokens=128, temperature=0.7, error_tr="❌ Şiir oluşturulamadı.", error_en="❌ Could not generate poem.")
+COMMANDS.llm("story", "You are a storyteller. Write a short story about the topic.",
+             help_tr="Konuya hikaye oluştur", help_en="Create story", args_tr="<konu>", args_en="<topic>",
+             max_tokens=256, temperature=0.7, stream=True,
+             error_tr="❌ Hikaye oluşturulamadı.", error_en="❌ Could not generate story.")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id=update.effective_user.id
     user_text=update.message.text
-    manual_pref=USER_LANG_PREF.get(user_id)
-    detected=detect_language(user_text)
-    lang=manual_pref or detected
-    USER_LANG_PREF[user_id]=lang
+    lang=sessions.lang(user_id,None)
+    if lang is None:
+        lang=await detect_language(user_text)
+        sessions.set_lang(user_id,lang)
     add_to_history(user_id,"user",user_text)
     increment_stat(user_id)
     system_prompt=get_system_prompt(lang)
-    payload={"model":"mistralai/mistral-7b-instruct","messages":[{"role":"system","content":system_prompt}] + USER_HISTORY.get(user_id,[]), "max_tokens":128, "temperature":0.6}
-    headers={"Authorization":f"Bearer {OPENROUTER_API_KEY}","Content-Type":"application/json"}
+    messages=[{"role":"system","content":system_prompt}] + sessions.history(user_id)
+    if STREAM_REPLIES:
+        progress=ProgressiveReply(update.message,outbox,STREAM_EDIT_INTERVAL,STREAM_EDIT_MIN_CHARS)
+        try:
+            async with scheduler.slot(user_id,"chat",supersede=True):
+                reply=await progress.consume(openrouter.stream("chat",messages,max_tokens=128,temperature=0.6,hedge=True))
+            add_to_history(user_id,"assistant",reply)
+        except Superseded:
+            pass
+        except SchedulerBusy:
+            await progress.fail(busy_text(lang))
+        except Exception as e:
+            logging.error(f"GPT ERROR: {e}")
+            await progress.fail(message_text("chat_error", lang))
+        return
     try:
-        r=await http_client.post("https://openrouter.ai/api/v1/chat/completions",json=payload,headers=headers)
-        data=r.json()
-        if r.status_code==200:
-            reply=data["choices"][0]["message"]["content"]
-        else:
-            raise Exception(data.get("error",{}).get("message","Bilinmeyen hata"))
+        async with scheduler.slot(user_id,"chat",supersede=True):
+            reply=await openrouter.complete("chat",messages,max_tokens=128,temperature=0.6,hedge=True)
         add_to_history(user_id,"assistant",reply)
-        await update.message.reply_text(reply)
+        await outbox.reply(update.message, reply)
+    except Superseded:
+        pass
+    except SchedulerBusy:
+        await outbox.reply(update.message, busy_text(lang))
     except Exception as e:
         logging.error(f"GPT ERROR: {e}")
-        err="❌ GPT yanıtı alınamadı. Lütfen daha sonra tekrar deneyin." if lang=="tr" else "❌ Could not generate a response. Try again later."
-        await update.message.reply_text(err)
+        await outbox.reply(update.message, message_text("chat_error", lang))
+
+@COMMANDS.command("metrics", hidden=True)
+async def metrics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    cache = response_cache.stats()
+    text = (
+        metrics.summary()
+        + f"\n\nusers: {sessions.memory_usage()}"
+        + f"\ncache: {cache['hits']} hit / {cache['misses']} miss"
+        + f"\nscheduler: active={scheduler.active} queued={scheduler.queued} rejected={scheduler.rejected}"
+        + f"\noutbox: sent={outbox.sent} edited={outbox.edited} merged={outbox.merged} retried={outbox.retried}"
+    )
+    await outbox.reply(update.message, text[:4096])
+
+async def preload_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user:
+        await sessions.load(update.effective_user.id)
+
+async def on_startup(app):
+    await cpu_executor.start()
+    await asyncio.to_thread(language_detector.preload)
+    sessions.start(STORAGE_FLUSH_INTERVAL)
+    if os.getenv("SHARD_INDEX", "0") == "0":
+        try:
+            await COMMANDS.publish(app.bot)
+        except TelegramError as e:
+            logging.warning(f"Could not set the command menu: {e}")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_LISTEN, METRICS_PORT)
+
+async def on_shutdown(app):
+    pending = list(SUMMARY_TASKS.values())
+    for user_id in list(SUMMARY_TASKS):
+        cancel_summary(user_id)
+    await asyncio.gather(*pending, return_exceptions=True)
+    await sessions.stop()
+    await openrouter.aclose()
+    logging.info(f"Response cache: {response_cache.stats()}")
+    logging.info(f"Session store: {sessions.memory_usage()}")
+    response_cache.close()
+    cpu_executor.close()
+
+def build_application(builder=None):
+    bootstrap()
+    builder=builder or ApplicationBuilder().token(TELEGRAM_BOT_TOKEN)
+    app=builder.concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES)).post_init(on_startup).post_shutdown(on_shutdown).build()
+    app.add_handler(TypeHandler(Update,preload_session),group=-1)
+    app.add_handlers(COMMANDS.handlers(run_llm_command, metrics.timed))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,metrics.timed("chat",handle_message)))
+    return app
+
+def run_front(app):
+    if BOT_MODE == "webhook":
+        url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH.strip('/')}"
+        asyncio.run(serve_webhook(app, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, url, WEBHOOK_SECRET))
+    else:
+        app.run_polling()
 
 def main():
-    app=ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-    app.add_handler(CommandHandler("start",start))
-    app.add_handler(CommandHandler("help",help_command))
-    app.add_handler(CommandHandler("lang",lang_command))
-    app.add_handler(CommandHandler("reset",reset_command))
-    app.add_handler(CommandHandler("stats",stats_command))
-    app.add_handler(CommandHandler("joke",joke_command))
-    app.add_handler(CommandHandler("quote",quote_command))
-    app.add_handler(CommandHandler("fact",fact_command))
-    app.add_handler(CommandHandler("translate",translate_command))
-    app.add_handler(CommandHandler("summary",summary_command))
-    app.add_handler(CommandHandler("define",define_command))
-    app.add_handler(CommandHandler("todo_add",todo_add))
-    app.add_handler(CommandHandler("todo_list",todo_list))
-    app.add_handler(CommandHandler("todo_clear",todo_clear))
-    app.add_handler(CommandHandler("ping",ping_command))
-    app.add_handler(CommandHandler("time",time_command))
-    app.add_handler(CommandHandler("roll",roll_command))
-    app.add_handler(CommandHandler("flip",flip_command))
-    app.add_handler(CommandHandler("calc",calc_command))
-    app.add_handler(CommandHandler("echo",echo_command))
-    app.add_handler(CommandHandler("about",about_command))
-    app.add_handler(CommandHandler("user",user_command))
-    app.add_handler(CommandHandler("random",random_command))
-    app.add_handler(CommandHandler("poem",poem_command))
-    app.add_handler(CommandHandler("story",story_command))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,handle_message))
-    app.run_polling()
+    if SHARDS > 1:
+        run_sharded(SHARDS, TELEGRAM_BOT_TOKEN, run_front, METRICS_PORT)
+    else:
+        run_front(build_application())
 
 if __name__=="__main__":
     main()
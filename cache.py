@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def make_key(command: str, model: str, system_prompt: str, text: str, target: str = "") -> str:
+    # Case can change what the text means ("Polish" vs "polish"), so only the
+    # target (a language name or code) is casefolded.
+    raw = "\x1f".join((command, model, system_prompt, normalize(text), normalize(target).casefold()))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Base class for LLM response caches; tracks hit/miss counters."""
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, recheck: bool = False):
+        """Cached value for `key`, or None.
+
+        `recheck` is for a second look by a caller that already counted a
+        miss (e.g. after waiting for an upstream slot): a hit there turns that
+        miss into a hit and a miss is not counted again.
+        """
+        value = await self._get(key)
+        if recheck:
+            if value is not None:
+                self.misses -= 1
+                self.hits += 1
+        elif value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        await self._set(key, value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    async def _get(self, key: str):
+        return None
+
+    async def _set(self, key: str, value: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class NullCache(ResponseCache):
+    pass
+
+
+class MemoryCache(ResponseCache):
+    def __init__(self, max_entries: int = 5000, ttl: float = 86400.0):
+        super().__init__(max_entries, ttl)
+        self._data = OrderedDict()
+
+    async def _get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: str):
+        self._data[key] = (value, time.time() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache(ResponseCache):
+    """Disk-backed cache so answers survive restarts; LRU by last access time.
+
+    Hits only write when the stored access time is older than
+    `touch_interval`, and the row count is tracked in memory; when it passes
+    `max_entries` the table is recounted (other processes may share the file)
+    and trimmed to 90% so the next trim is a while away.
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, ttl: float = 7 * 86400.0,
+                 touch_interval: float = 300.0):
+        super().__init__(max_entries, ttl)
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def _get_sync(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM responses WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._count -= self._conn.execute("DELETE FROM responses WHERE key=?", (key,)).rowcount
+                self._conn.commit()
+                return None
+            if now - row[2] > self.touch_interval:
+                self._conn.execute("UPDATE responses SET accessed_at=? WHERE key=?", (now, key))
+                self._conn.commit()
+            return row[0]
+
+    def _set_sync(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key=?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._trim(now)
+            self._conn.commit()
+
+    def _trim(self, now: float):
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            count -= self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,)).rowcount
+            keep = self.max_entries * 9 // 10
+            if count > keep:
+                count -= self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - keep,),
+                ).rowcount
+        self._count = count
+
+    async def _get(self, key: str):
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def _set(self, key: str, value: str):
+        await asyncio.to_thread(self._set_sync, key, value)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_cache(backend: str, path: str = "askzen_cache.db", max_entries: int = 5000,
+                 ttl: float = 86400.0) -> ResponseCache:
+    if backend == "sqlite":
+        return SQLiteCache(path, max_entries, ttl)
+    if backend == "memory":
+        return MemoryCache(max_entries, ttl)
+    return NullCache(max_entries, ttl)
@@ -0,0 +1,82 @@
+import ast
+import math
+import operator
+
+MAX_EXPRESSION_CHARS = 200
+MAX_INT_BITS = 1024
+# A left-associative chain like 1+1+...+1 nests one level per operator.
+MAX_DEPTH = MAX_EXPRESSION_CHARS
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+
+class CalcError(ValueError):
+    pass
+
+
+def _bits(value) -> float:
+    if isinstance(value, int):
+        return value.bit_length()
+    return math.log2(abs(value)) + 1 if value and math.isfinite(value) else 0
+
+
+def _check(value):
+    if isinstance(value, complex):
+        raise CalcError("complex result")
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalcError("result too large")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise CalcError("result too large")
+    return value
+
+
+def _power(base, exponent):
+    # Estimate the size before computing: 9**9**9 would otherwise take minutes.
+    if abs(base) > 1 and exponent > 0 and math.log2(abs(base)) * exponent > MAX_INT_BITS:
+        raise CalcError("result too large")
+    return base ** exponent
+
+
+def _eval(node, depth: int = 0):
+    if depth > MAX_DEPTH:
+        raise CalcError("expression too deep")
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, depth + 1)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return _check(node.value)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPS:
+        return UNARY_OPS[type(node.op)](_eval(node.operand, depth + 1))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+        left = _eval(node.left, depth + 1)
+        right = _eval(node.right, depth + 1)
+        if isinstance(node.op, ast.Pow):
+            return _check(_power(left, right))
+        if isinstance(node.op, ast.Mult) and _bits(left) + _bits(right) > MAX_INT_BITS + 1:
+            raise CalcError("result too large")
+        return _check(BINARY_OPS[type(node.op)](left, right))
+    raise CalcError("unsupported expression")
+
+
+def evaluate(expression: str):
+    """Evaluate + - * / // % ** and parentheses over int/float literals.
+
+    Operands and results are capped at MAX_INT_BITS so inputs like 9**9**9
+    are rejected up front instead of tying up a CPU. Raises CalcError (or
+    ZeroDivisionError/OverflowError from the arithmetic itself).
+    """
+    if len(expression) > MAX_EXPRESSION_CHARS:
+        raise CalcError("expression too long")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, RecursionError):
+        raise CalcError("invalid expression")
+    return _eval(tree)
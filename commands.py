@@ -0,0 +1,160 @@
+import re
+
+from telegram import BotCommand
+from telegram.ext import CommandHandler
+
+LANGUAGES = ("tr", "en")
+USAGE_PREFIX = {"tr": "Kullanım", "en": "Usage"}
+
+# Replies shared by several commands; per-command ones live in Command.messages.
+MESSAGES = {
+    "busy": {
+        "tr": "⏳ Şu an çok yoğunum, lütfen biraz sonra tekrar dene.",
+        "en": "⏳ I'm busy right now, please try again in a moment.",
+    },
+    "batch_limit": {
+        "tr": "En fazla {limit} öğe gönderebilirsin.",
+        "en": "You can send at most {limit} items at once.",
+    },
+    "chat_error": {
+        "tr": "❌ GPT yanıtı alınamadı. Lütfen daha sonra tekrar deneyin.",
+        "en": "❌ Could not generate a response. Try again later.",
+    },
+    "system_prompt": {
+        "tr": "Sen yardımcı bir asistansın. Kullanıcının dilinde yanıt ver.",
+        "en": "You are a helpful assistant. Reply in the user's language.",
+    },
+}
+
+
+def _pick(table: dict, key: str, lang: str, fmt: dict) -> str:
+    texts = table[key]
+    text = texts.get(lang, texts["en"])
+    return text.format(**fmt) if fmt else text
+
+
+def text(key: str, lang: str, **fmt) -> str:
+    """Shared reply `key` in `lang`, falling back to English."""
+    return _pick(MESSAGES, key, lang, fmt)
+
+
+class Command:
+    """One bot command as data: help, usage and reply texts per language, plus
+    the prompt and sampling settings when the command is answered by the LLM.
+
+    `messages` maps a reply key to its {"tr": ..., "en": ...} texts, which
+    may hold str.format fields; text() looks there first, then in MESSAGES.
+
+    `prompt` may reference leading arguments named in `params` (e.g.
+    "{target}"); whatever follows them is the user text sent to the model.
+    When `batch` is a regex, a text it splits into several items is answered
+    item by item from one request.
+    """
+
+    __slots__ = ("name", "callback", "help", "args", "usage_text", "prompt", "params", "model",
+                 "max_tokens", "temperature", "cached", "stream", "batch", "error", "messages", "hidden")
+
+    def __init__(self, name: str, callback=None, help_tr: str = "", help_en: str = "", args_tr: str = "",
+                 args_en: str = "", prompt: str = None, params: tuple = (), model: str = None,
+                 max_tokens: int = 128, temperature: float = 0.7, cached: bool = False, stream: bool = False,
+                 batch: str = None, error_tr: str = "", error_en: str = "", messages: dict = None,
+                 hidden: bool = False):
+        self.name = name
+        self.callback = callback
+        self.help = {"tr": help_tr, "en": help_en}
+        self.args = {"tr": args_tr, "en": args_en}
+        self.usage_text = {lang: f"{USAGE_PREFIX[lang]}: /{name} {self.args[lang]}".rstrip() for lang in LANGUAGES}
+        self.prompt = prompt
+        self.params = tuple(params)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.cached = cached
+        self.stream = stream
+        self.batch = re.compile(batch) if batch else None
+        self.error = {"tr": error_tr, "en": error_en}
+        self.messages = messages or {}
+        self.hidden = hidden
+
+    def usage(self, lang: str) -> str:
+        return self.usage_text.get(lang, self.usage_text["en"])
+
+    def text(self, key: str, lang: str, **fmt) -> str:
+        if key in self.messages:
+            return _pick(self.messages, key, lang, fmt)
+        return text(key, lang, **fmt)
+
+    def split(self, text: str) -> list:
+        """Split `text` into batch items; a single item means no batch."""
+        if self.batch is None:
+            return [text]
+        items = []
+        for item in self.batch.split(text):
+            item = item.strip()
+            if item and item not in items:
+                items.append(item)
+        return items or [text]
+
+    def help_line(self, lang: str) -> str:
+        args = f" {self.args[lang]}" if self.args[lang] else ""
+        return f"/{self.name}{args} - {self.help[lang]}"
+
+
+class CommandRegistry:
+    """Ordered set of Commands that handlers, /help and the menu are built from."""
+
+    def __init__(self):
+        self._commands = {}
+        self._help = {}
+
+    def __iter__(self):
+        return iter(self._commands.values())
+
+    def __getitem__(self, name: str) -> Command:
+        return self._commands[name]
+
+    def add(self, command: Command) -> Command:
+        self._commands[command.name] = command
+        self._help.clear()
+        return command
+
+    def command(self, name: str, **spec):
+        """Decorator registering a hand-written handler under `name`."""
+        def decorator(callback):
+            self.add(Command(name, callback, **spec))
+            return callback
+        return decorator
+
+    def llm(self, name: str, prompt: str, **spec) -> Command:
+        """Register a command answered by the shared LLM runner."""
+        return self.add(Command(name, prompt=prompt, **spec))
+
+    def help_text(self, lang: str) -> str:
+        text = self._help.get(lang)
+        if text is None:
+            text = self._help[lang] = "".join(f"{c.help_line(lang)}\n" for c in self if not c.hidden)
+        return text
+
+    def bot_commands(self, lang: str) -> list:
+        return [BotCommand(c.name, c.help[lang]) for c in self if not c.hidden]
+
+    async def publish(self, bot):
+        """Install the Telegram command menu: English by default, Turkish for tr clients."""
+        await bot.set_my_commands(self.bot_commands("en"))
+        await bot.set_my_commands(self.bot_commands("tr"), language_code="tr")
+
+    def handlers(self, llm_runner, wrap=None) -> list:
+        handlers = []
+        for command in self:
+            callback = command.callback or _bind(llm_runner, command)
+            if wrap is not None:
+                callback = wrap(command.name, callback)
+            handlers.append(CommandHandler(command.name, callback))
+        return handlers
+
+
+def _bind(runner, command: Command):
+    async def callback(update, context):
+        return await runner(update, context, command)
+    callback.__name__ = f"{command.name}_command"
+    return callback
@@ -0,0 +1,118 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+
+
+class CPUTaskError(Exception):
+    pass
+
+
+class CPUTimeout(CPUTaskError):
+    pass
+
+
+def _ready():
+    return True
+
+
+class CPUExecutor:
+    """Runs CPU-bound helpers off the event loop with a per-task timeout.
+
+    With workers > 0 each worker is its own single-process pool. A task waits
+    for an idle worker before its timeout starts, and a task that overruns it
+    only costs its own worker, which is killed and replaced; other tasks keep
+    running. A worker that dies is replaced and the task retried once before
+    CPUTaskError is raised. Workers come from a forkserver, never from a fork
+    of this threaded process. With workers = 0 tasks run in the default thread
+    pool, which keeps the loop responsive but cannot stop a runaway task.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 2.0, initializer=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.initializer = initializer
+        self.timeouts = 0
+        self._context = multiprocessing.get_context("forkserver")
+        self._idle = None
+        self._pools = set()
+        self._spawning = set()
+
+    async def start(self):
+        if self.workers > 0 and self._idle is None:
+            self._idle = asyncio.Queue()
+            await asyncio.gather(*(self._spawn() for _ in range(self.workers)))
+
+    async def _spawn(self):
+        pool = concurrent.futures.ProcessPoolExecutor(1, mp_context=self._context, initializer=self.initializer)
+        self._pools.add(pool)
+        try:
+            # Start the process and run the initializer before any task's clock starts.
+            await asyncio.get_running_loop().run_in_executor(pool, _ready)
+        except Exception as e:
+            logging.warning(f"CPU worker failed to start: {e}")
+            self._discard(pool)
+            pool = None
+        if self._idle is not None:
+            # None stands in for a worker that could not start: whoever draws
+            # it fails fast and triggers another attempt.
+            self._idle.put_nowait(pool)
+
+    def _discard(self, pool):
+        self._pools.discard(pool)
+        # ProcessPoolExecutor cannot cancel a running task; stop the process
+        # so the stuck task does not keep burning a core.
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _replace(self, pool):
+        if pool is not None:
+            self._discard(pool)
+        if self._idle is not None:
+            task = asyncio.get_running_loop().create_task(self._spawn())
+            self._spawning.add(task)
+            task.add_done_callback(self._spawning.discard)
+
+    async def run(self, func, *args, timeout: float = None):
+        name = getattr(func, "__name__", str(func))
+        call = functools.partial(func, *args)
+        if self.workers <= 0:
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(call), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise CPUTimeout(name)
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = await self._idle.get()
+            if pool is None:
+                self._replace(None)
+                raise CPUTaskError(name)
+            try:
+                result = await asyncio.wait_for(loop.run_in_executor(pool, call), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logging.warning(f"CPU task {name} timed out")
+                self._replace(pool)
+                raise CPUTimeout(name)
+            except BrokenProcessPool:
+                self._replace(pool)
+                if attempt:
+                    raise CPUTaskError(name)
+                continue
+            except BaseException:
+                self._idle.put_nowait(pool)
+                raise
+            self._idle.put_nowait(pool)
+            return result
+
+    def close(self):
+        for task in list(self._spawning):
+            task.cancel()
+        for pool in list(self._pools):
+            self._discard(pool)
+        self._idle = None
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+from langdetect import DetectorFactory, LangDetectException, detect
+from langdetect.detector_factory import init_factory
+
+from cpu import CPUTaskError
+
+TURKISH_ONLY_CHARS = frozenset("ğĞşŞıİ")
+SAMPLE_CHARS = 500
+
+
+def preload():
+    DetectorFactory.seed = 0
+    init_factory()
+
+
+def classify(sample: str) -> str:
+    """Run langdetect on an already-normalized sample; picklable for a process pool."""
+    try:
+        return "tr" if detect(sample) == "tr" else "en"
+    except LangDetectException:
+        return "en"
+
+
+class LanguageDetector:
+    """tr/en detection with cheap shortcuts in front of langdetect.
+
+    Letters that only Turkish uses decide immediately; otherwise a bounded
+    memo of recent inputs is consulted before running langdetect, which is
+    seeded so the same text always gets the same answer.
+    """
+
+    def __init__(self, cache_size: int = 2048):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        DetectorFactory.seed = 0
+
+    def preload(self):
+        preload()
+
+    def _lookup(self, sample: str):
+        if not TURKISH_ONLY_CHARS.isdisjoint(sample):
+            return "tr"
+        cached = self._cache.get(sample)
+        if cached is not None:
+            self._cache.move_to_end(sample)
+        return cached
+
+    def _remember(self, sample: str, lang: str) -> str:
+        self._cache[sample] = lang
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return lang
+
+    def detect(self, text: str) -> str:
+        sample = " ".join(text[:SAMPLE_CHARS].split())
+        return self._lookup(sample) or self._remember(sample, classify(sample))
+
+    async def detect_async(self, text: str, executor) -> str:
+        """Like detect, but langdetect itself runs on `executor` (a CPUExecutor).
+
+        Shortcuts and the memo stay in-process; a detection that times out or
+        loses its worker falls back to English without being memoized.
+        """
+        sample = " ".join(text[:SAMPLE_CHARS].split())
+        lang = self._lookup(sample)
+        if lang is not None:
+            return lang
+        try:
+            return self._remember(sample, await executor.run(classify, sample))
+        except CPUTaskError:
+            return "en"
@@ -0,0 +1,193 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._function = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        """Compute the value at scrape time; `function` returns a number or a {labels: value} dict."""
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        value = self._function()
+        if isinstance(value, dict):
+            return [(self.name, self._key(labels) if isinstance(labels, dict) else labels, v)
+                    for labels, v in value.items()]
+        return [(self.name, (), value)]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q: float, **labels) -> float:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            if entry is None or entry[2] == 0:
+                return math.nan
+            counts = list(entry[0])
+            total = entry[2]
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = Registry()
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    "askzen_handler_seconds", "Telegram handler latency.", ["command"]))
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    "askzen_openrouter_request_seconds", "OpenRouter request latency.", ["model", "status"]))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "askzen_openrouter_requests_total", "OpenRouter requests by status code.", ["model", "status"]))
+UPSTREAM_TOKENS = REGISTRY.register(Counter(
+    "askzen_openrouter_tokens_total", "Tokens reported in the OpenRouter usage field.", ["model", "kind"]))
+LANGDETECT_LATENCY = REGISTRY.register(Histogram(
+    "askzen_langdetect_seconds", "Language detection time.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "askzen_scheduler_wait_seconds", "Time LLM requests wait for a scheduler slot.", ["kind"]))
+ACTIVE_USERS = REGISTRY.register(Gauge(
+    "askzen_active_users", "Users seen within the window.", ["window"]))
+CACHE_EVENTS = REGISTRY.register(Gauge(
+    "askzen_cache_events", "Response cache hits and misses since start.", ["result"]))
+
+
+def record_usage(model: str, usage: dict):
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            UPSTREAM_TOKENS.inc(usage[kind], model=model, kind=kind.split("_")[0])
+
+
+def timed(command: str, handler):
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await handler(update, context)
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - start, command=command)
+    return wrapper
+
+
+def summary() -> str:
+    """Short human-readable view of handler and upstream latency."""
+    lines = []
+    for key, entry in sorted(HANDLER_LATENCY._values.items()):
+        command = key[0]
+        p50 = HANDLER_LATENCY.quantile(0.5, command=command)
+        p95 = HANDLER_LATENCY.quantile(0.95, command=command)
+        lines.append(f"/{command}: n={entry[2]} p50≤{p50}s p95≤{p95}s")
+    for (model, status), count in sorted(UPSTREAM_REQUESTS._values.items()):
+        lines.append(f"{model} [{status}]: {int(count)}")
+    return "\n".join(lines) or "No data yet."
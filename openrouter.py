@@ -0,0 +1,251 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+import metrics
+from resilience import RETRYABLE_STATUS, CircuitBreaker, backoff_delay, hedged, parse_retry_after
+from singleflight import SingleFlight
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+DEFAULT_MODEL = "mistralai/mistral-7b-instruct"
+FALLBACK_MODELS = [DEFAULT_MODEL, "meta-llama/llama-3.1-8b-instruct"]
+DEFAULT_TIMEOUT = 15.0
+TIMEOUTS = {
+    "chat": 20.0,
+    "translate": 15.0,
+    "summary": 20.0,
+    "define": 10.0,
+    "poem": 20.0,
+    "story": 30.0,
+}
+
+
+class OpenRouterError(Exception):
+    def __init__(self, message: str, status_code: int = 0, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code in RETRYABLE_STATUS
+
+
+class CircuitOpenError(OpenRouterError):
+    pass
+
+
+def error_message(body: bytes) -> str:
+    try:
+        return json.loads(body).get("error", {}).get("message", "Hata")
+    except (ValueError, AttributeError):
+        return "Hata"
+
+
+class OpenRouterClient:
+    """Shared async client for the OpenRouter chat/completions endpoint.
+
+    Owns one pooled httpx client (HTTP/2 when h2 is installed) and the prebuilt
+    auth headers, so every command posts through the same tuned connections.
+
+    Each call walks the ordered `models` list: 429/5xx answers are retried on
+    the same model with jittered backoff (Retry-After wins), timeouts and
+    exhausted retries move on to the next model, and a per-model circuit
+    breaker skips models that keep failing. With `hedge=True` the next model
+    is also asked if the first has not answered within `hedge_delay`.
+    """
+
+    def __init__(self, api_key: str, url: str = OPENROUTER_URL, max_connections: int = 50,
+                 max_keepalive: int = 20, keepalive_expiry: float = 30.0, http2: bool = True,
+                 models: list = None, max_retries: int = 2, retry_cap: float = 4.0,
+                 hedge_delay: float = 3.0, breaker_threshold: int = 5, breaker_timeout: float = 30.0):
+        self.url = url
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.models = list(models or FALLBACK_MODELS)
+        self.max_retries = max_retries
+        self.retry_cap = retry_cap
+        self.hedge_delay = hedge_delay
+        self.breakers = {m: CircuitBreaker(breaker_threshold, breaker_timeout) for m in self.models}
+        self._client = None
+        self._inflight = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                headers=self.headers,
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=5.0),
+            )
+        return self._client
+
+    def build_payload(self, messages: list, max_tokens: int, temperature: float) -> dict:
+        return {
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            first = next(iter(self.breakers.values()))
+            breaker = self.breakers[model] = CircuitBreaker(first.failure_threshold, first.recovery_timeout)
+        return breaker
+
+    async def complete(self, command: str, messages: list, max_tokens: int, temperature: float,
+                       model: str = None, hedge: bool = False) -> str:
+        payload = self.build_payload(messages, max_tokens, temperature)
+        key = (command, model, json.dumps(payload, sort_keys=True, ensure_ascii=False))
+        models = [model] if model else self.models
+        call = lambda m: self._post(command, {**payload, "model": m})
+        return await self._inflight.do(key, self._with_fallback, models, call, hedge)
+
+    async def _post(self, command: str, payload: dict) -> str:
+        timeout = TIMEOUTS.get(command, DEFAULT_TIMEOUT)
+        model = payload["model"]
+        start = time.perf_counter()
+        status = "error"
+        try:
+            r = await self.client.post(self.url, json=payload, timeout=timeout)
+            status = r.status_code
+        finally:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start, model=model, status=status)
+            metrics.UPSTREAM_REQUESTS.inc(model=model, status=status)
+        if r.status_code != 200:
+            raise OpenRouterError(error_message(r.content), r.status_code,
+                                  parse_retry_after(r.headers.get("Retry-After")))
+        data = r.json()
+        metrics.record_usage(model, data.get("usage"))
+        return data["choices"][0]["message"]["content"]
+
+    async def _attempt(self, model: str, call):
+        breaker = self.breaker(model)
+        probe = breaker.state == breaker.HALF_OPEN
+        if not breaker.allow():
+            raise CircuitOpenError(f"{model} is temporarily unavailable", 503)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = await call(model)
+                except OpenRouterError as e:
+                    if not e.retryable:
+                        raise
+                    delay = backoff_delay(attempt, cap=self.retry_cap, retry_after=e.retry_after)
+                    if attempt >= self.max_retries or delay > self.retry_cap:
+                        breaker.record_failure()
+                        raise
+                except httpx.TransportError as e:
+                    breaker.record_failure()
+                    raise OpenRouterError(f"{model}: {type(e).__name__}", 504) from e
+                else:
+                    breaker.record_success()
+                    return result
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            if probe:
+                breaker.release()
+
+    async def _with_fallback(self, models: list, call, hedge: bool = False, discard=None):
+        candidates = [m for m in models if self.breaker(m).available()]
+        if not candidates:
+            raise CircuitOpenError("OpenRouter is temporarily unavailable", 503)
+        if hedge and len(candidates) > 1:
+            first, second = candidates[0], candidates[1]
+            rest = candidates[2:]
+            try:
+                return await hedged(lambda: self._attempt(first, call), lambda: self._attempt(second, call),
+                                    self.hedge_delay, discard)
+            except OpenRouterError as e:
+                if not (e.retryable or isinstance(e, CircuitOpenError)) or not rest:
+                    raise
+                candidates = rest
+        error = None
+        for model in candidates:
+            try:
+                return await self._attempt(model, call)
+            except OpenRouterError as e:
+                if not (e.retryable or isinstance(e, CircuitOpenError) or e.status_code == 404):
+                    raise
+                error = e
+        raise error
+
+    async def stream(self, command: str, messages: list, max_tokens: int, temperature: float,
+                     model: str = None, hedge: bool = False):
+        """Yield content deltas from an SSE chat/completions stream.
+
+        Retries, fallback and hedging apply until the first token arrives;
+        after that the text is already on screen, so errors propagate.
+        """
+        payload = self.build_payload(messages, max_tokens, temperature)
+        payload["stream"] = True
+        payload["usage"] = {"include": True}
+        models = [model] if model else self.models
+        call = lambda m: self._prime(self._stream_model(command, {**payload, "model": m}))
+        first, chunks = await self._with_fallback(models, call, hedge, lambda result: result[1].aclose())
+        try:
+            if first:
+                yield first
+            async for delta in chunks:
+                yield delta
+        finally:
+            await chunks.aclose()
+
+    async def _prime(self, chunks):
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = ""
+        except BaseException:
+            await chunks.aclose()
+            raise
+        return first, chunks
+
+    async def _stream_model(self, command: str, payload: dict):
+        timeout = TIMEOUTS.get(command, DEFAULT_TIMEOUT)
+        model = payload["model"]
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with self.client.stream("POST", self.url, json=payload, timeout=timeout) as r:
+                status = r.status_code
+                if r.status_code != 200:
+                    raise OpenRouterError(error_message(await r.aread()), r.status_code,
+                                          parse_retry_after(r.headers.get("Retry-After")))
+                async for line in r.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        raise OpenRouterError(chunk["error"].get("message", "Hata"), r.status_code)
+                    metrics.record_usage(model, chunk.get("usage"))
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        finally:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start, model=model, status=status)
+            metrics.UPSTREAM_REQUESTS.inc(model=model, status=status)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
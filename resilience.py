@@ -0,0 +1,110 @@
+import asyncio
+import random
+import time
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value) -> float:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 4.0, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff; a server-sent Retry-After wins."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Fail fast while an upstream keeps failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls for `recovery_timeout` seconds. Then it goes half-open and
+    lets a single probe through while rejecting everyone else: a success
+    closes it, a failure reopens it, and a probe that ends without either
+    (a non-retryable error, a cancelled hedge) must call release().
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def available(self) -> bool:
+        """Whether allow() would let a call through, without claiming the probe."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self.probing)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return state != self.OPEN
+
+    def release(self):
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+async def hedged(first, second, delay: float, discard=None):
+    """Run `first()`; if it has not finished after `delay`, also start `second()`.
+
+    Returns the first successful result and cancels the other call. If one
+    call fails the other is still awaited; if both fail the first call's
+    error is raised. `discard` receives a successful result that lost the race.
+    """
+    primary = asyncio.ensure_future(first())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done and primary.exception() is None:
+            return primary.result()
+        tasks.append(asyncio.ensure_future(second()))
+        winner = None
+        pending = {task for task in tasks if not task.done()}
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    continue
+                if winner is None:
+                    winner = task
+                elif discard is not None:
+                    await discard(task.result())
+        if winner is not None:
+            return winner.result()
+        raise primary.exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import metrics
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class RateLimited(SchedulerBusy):
+    pass
+
+
+class Superseded(Exception):
+    pass
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def ready(self, now: float = None) -> bool:
+        """Whether take() would succeed, without taking a token."""
+        return self.tokens + ((time.monotonic() if now is None else now) - self.updated) * self.rate >= 1
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class FairScheduler:
+    """Admission control for upstream LLM calls.
+
+    At most `max_concurrent` calls run at once. Waiting requests sit in one
+    FIFO per user and free slots are handed out round-robin across users, so
+    one heavy user cannot starve the rest. Each user also has a token bucket
+    (`rate` requests/second, `burst` capacity), and full queues are rejected
+    immediately with SchedulerBusy instead of piling up latency.
+
+    Background work (`background=True`, e.g. history summaries) shares the
+    same concurrency cap and queue limit but skips the user's token bucket
+    and only gets a slot when no user request is waiting.
+    """
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 200, max_pending_per_user: int = 3,
+                 rate: float = 0.2, burst: int = 5):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_pending_per_user = max_pending_per_user
+        self.rate = rate
+        self.burst = burst
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        self.superseded = 0
+        self._queues = {}
+        self._ready = deque()
+        self._background = deque()
+        self._buckets = {}
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= 10000:
+                now = time.monotonic()
+                self._buckets = {uid: b for uid, b in self._buckets.items() if not b.full(now)}
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _cancel_pending(self, user_id: int, kind: str):
+        queue = self._queues.get(user_id)
+        if not queue:
+            return
+        for item in [item for item in queue if item[0] == kind]:
+            queue.remove(item)
+            self.queued -= 1
+            self.superseded += 1
+            if not item[1].done():
+                item[1].set_exception(Superseded())
+
+    def _dispatch(self):
+        while self.active < self.max_concurrent and self._ready:
+            user_id = self._ready.popleft()
+            queue = self._queues.get(user_id)
+            if not queue:
+                self._queues.pop(user_id, None)
+                continue
+            kind, gate = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._ready.append(user_id)
+            else:
+                del self._queues[user_id]
+            if gate.done():
+                continue
+            gate.set_result(None)
+            self.active += 1
+        while self.active < self.max_concurrent and self._background:
+            kind, gate = self._background.popleft()
+            self.queued -= 1
+            if gate.done():
+                continue
+            gate.set_result(None)
+            self.active += 1
+
+    async def acquire(self, user_id: int, kind: str = "llm", supersede: bool = False, background: bool = False):
+        if not background and not self._bucket(user_id).take():
+            self.rejected += 1
+            raise RateLimited()
+        if supersede:
+            self._cancel_pending(user_id, kind)
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            metrics.QUEUE_WAIT.observe(0.0, kind=kind)
+            return
+        queue = self._background if background else self._queues.get(user_id)
+        if self.queued >= self.max_queue or (not background and queue and len(queue) >= self.max_pending_per_user):
+            self.rejected += 1
+            raise SchedulerBusy()
+        gate = asyncio.get_running_loop().create_future()
+        item = (kind, gate)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        if not background and user_id not in self._ready:
+            self._ready.append(user_id)
+        queue.append(item)
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await gate
+            metrics.QUEUE_WAIT.observe(time.monotonic() - start, kind=kind)
+        except asyncio.CancelledError:
+            if gate.done() and not gate.cancelled():
+                self.release()
+            elif item in queue:
+                queue.remove(item)
+                self.queued -= 1
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, kind: str = "llm", supersede: bool = False, background: bool = False):
+        await self.acquire(user_id, kind, supersede, background)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.constants import ChatType
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from scheduler import TokenBucket
+
+TELEGRAM_MAX_LENGTH = 4096
+
+
+def split_text(text: str, limit: int = TELEGRAM_MAX_LENGTH) -> list:
+    """Split text into Telegram-sized parts, preferring line and word breaks."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut < limit // 2:
+            cut = text.rfind(" ", 0, limit)
+        if cut < limit // 2:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+async def _wait_for(bucket: TokenBucket):
+    while not bucket.take():
+        await asyncio.sleep(max(0.01, (1 - bucket.tokens) / bucket.rate))
+
+
+class _Outgoing:
+    __slots__ = ("text", "reply_to", "mergeable", "futures")
+
+    def __init__(self, text: str, reply_to, mergeable: bool, future):
+        self.text = text
+        self.reply_to = reply_to
+        self.mergeable = mergeable
+        self.futures = [future]
+
+
+class _Chat:
+    __slots__ = ("queue", "bucket", "worker")
+
+    def __init__(self, bucket: TokenBucket):
+        self.queue = deque()
+        self.bucket = bucket
+        self.worker = None
+
+
+class Outbox:
+    """Per-chat send queues in front of the Telegram Bot API.
+
+    Sends are paced by a global token bucket and a per-chat bucket (slower for
+    groups, which Telegram limits to about 20 messages a minute). RetryAfter
+    pauses the chat and retries instead of failing, connection errors are
+    retried with backoff (timeouts are not, since the message may have gone
+    out), texts over 4096 characters are split, and small messages that queue
+    up for the same chat are merged into one send. Edits go through edit() so
+    they draw on the same buckets.
+    """
+
+    def __init__(self, global_rate: float = 30.0, private_rate: float = 1.0, group_rate: float = 1 / 3,
+                 burst: int = 3, merge_limit: int = 1000, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.merge_limit = merge_limit
+        self.max_retries = max_retries
+        self.sent = 0
+        self.merged = 0
+        self.retried = 0
+        self.edited = 0
+        self._chats = {}
+
+    def _chat(self, chat_id: int, chat_type: str) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= 10000:
+                now = time.monotonic()
+                self._chats = {cid: c for cid, c in self._chats.items()
+                               if c.worker is not None or not c.bucket.full(now)}
+            rate = self.private_rate if chat_type == ChatType.PRIVATE else self.group_rate
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, self.burst))
+        return chat
+
+    async def reply(self, message, text: str, mergeable: bool = True):
+        """Queue `text` as a reply to `message`; returns the last Message sent.
+
+        Like Message.reply_text, replies quote the original outside private
+        chats. Pass mergeable=False when the returned Message will be edited.
+        """
+        chat = message.chat
+        reply_to = message.message_id if chat.type != ChatType.PRIVATE else None
+        return await self.send(message.get_bot(), chat.id, text, chat.type, reply_to, mergeable)
+
+    async def send(self, bot, chat_id: int, text: str, chat_type: str = ChatType.PRIVATE,
+                   reply_to: int = None, mergeable: bool = True):
+        parts = split_text(text)
+        loop = asyncio.get_running_loop()
+        chat = self._chat(chat_id, chat_type)
+        futures = []
+        for part in parts:
+            future = loop.create_future()
+            chat.queue.append(_Outgoing(part, reply_to, mergeable and len(parts) == 1, future))
+            futures.append(future)
+        if chat.worker is None:
+            chat.worker = asyncio.create_task(self._drain(bot, chat_id, chat))
+        results = await asyncio.gather(*futures)
+        return results[-1]
+
+    async def edit(self, message, text: str, wait: bool = True):
+        """Edit a sent message in place once the chat and global buckets allow it.
+
+        With wait=False an edit that would have to wait is skipped and None
+        returned, for intermediate edits that a later one will supersede.
+        """
+        chat = self._chat(message.chat.id, message.chat.type)
+        if not wait and not (chat.bucket.ready() and self.global_bucket.ready()):
+            return None
+        await _wait_for(chat.bucket)
+        await _wait_for(self.global_bucket)
+        result = await message.edit_text(text)
+        self.edited += 1
+        return result
+
+    def _take(self, chat: _Chat) -> _Outgoing:
+        item = chat.queue.popleft()
+        while (item.mergeable and chat.queue and chat.queue[0].mergeable
+               and chat.queue[0].reply_to == item.reply_to
+               and len(item.text) + len(chat.queue[0].text) + 2 <= self.merge_limit):
+            other = chat.queue.popleft()
+            item.text = f"{item.text}\n\n{other.text}"
+            item.futures.extend(other.futures)
+            self.merged += 1
+        return item
+
+    async def _drain(self, bot, chat_id: int, chat: _Chat):
+        try:
+            while chat.queue:
+                item = self._take(chat)
+                try:
+                    result = await self._deliver(bot, chat_id, chat, item)
+                except Exception as e:
+                    for future in item.futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            chat.worker = None
+
+    async def _deliver(self, bot, chat_id: int, chat: _Chat, item: _Outgoing):
+        attempt = 0
+        while True:
+            await _wait_for(chat.bucket)
+            await _wait_for(self.global_bucket)
+            try:
+                result = await bot.send_message(chat_id=chat_id, text=item.text,
+                                                reply_to_message_id=item.reply_to)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                self.retried += 1
+                logging.warning(f"Flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except NetworkError as e:
+                # A timed-out send may already have been delivered; retrying
+                # it could post the message twice.
+                if isinstance(e, (BadRequest, TimedOut)) or attempt >= self.max_retries:
+                    raise
+                self.retried += 1
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                attempt += 1
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+
+def shard_for(user_id, shards: int) -> int:
+    return (user_id or 0) % shards
+
+
+class ShardRouter:
+    """Front-process handler that forwards each update to its user's worker.
+
+    All updates from one user land on the same worker, so that worker owns
+    the user's in-memory session and its write-behind flushes; the SQLite
+    store underneath is shared by every worker. Ownership only holds within
+    one host and one front end: flushes replace whole user records, so two
+    front ends (or a changed shard count while old workers still run) would
+    overwrite each other's changes.
+
+    Workers do not share rate limiters, so each one paces Telegram sends and
+    caps LLM calls at 1/N of the bot-wide limits (see bot.bootstrap). Group
+    chats are paced per shard at that reduced rate, since the members of one
+    group can be owned by different shards.
+
+    A worker found dead when an update is routed to it is restarted; updates
+    already queued for it wait for the new process. A shard that dies more
+    than `max_restarts` times within `restart_window` seconds (e.g. its
+    metrics port is taken) stops the front end with SIGTERM, and
+    run_sharded() then raises.
+    """
+
+    def __init__(self, queues: list, workers: list, start_worker, max_restarts: int = 3,
+                 restart_window: float = 60.0, stop_front=None):
+        self.queues = queues
+        self.workers = workers
+        self.start_worker = start_worker
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.routed = [0] * len(queues)
+        self.restarts = [deque() for _ in queues]
+        self.stop_front = stop_front or (lambda: os.kill(os.getpid(), signal.SIGTERM))
+        self.failed = None
+
+    def ensure_alive(self, index: int) -> bool:
+        worker = self.workers[index]
+        if worker.is_alive():
+            return True
+        if self.failed is not None:
+            return False
+        now = time.monotonic()
+        restarts = self.restarts[index]
+        while restarts and now - restarts[0] > self.restart_window:
+            restarts.popleft()
+        if len(restarts) >= self.max_restarts:
+            self.failed = f"shard {index} keeps dying (exit code {worker.exitcode})"
+            logging.critical(f"{self.failed}, stopping the front end")
+            self.stop_front()
+            return False
+        logging.error(f"Shard {index} died (exit code {worker.exitcode}), restarting it")
+        restarts.append(now)
+        self.workers[index] = self.start_worker(index)
+        return True
+
+    async def route(self, update: Update, context):
+        user = update.effective_user
+        index = shard_for(user.id if user else 0, len(self.queues))
+        if not self.ensure_alive(index):
+            logging.error(f"Dropped update {update.update_id}: shard {index} is down")
+            return
+        try:
+            self.queues[index].put(update.to_dict())
+        except Exception:
+            logging.exception(f"Could not route update {update.update_id} to shard {index}")
+            return
+        self.routed[index] += 1
+
+
+async def _serve_shard(index: int, queue):
+    import bot
+
+    logging.info(f"Shard {index} starting (pid {os.getpid()})")
+    app = bot.build_application(ApplicationBuilder().token(bot.TELEGRAM_BOT_TOKEN).updater(None))
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+    except Exception:
+        # Release the CPU pool and stores, or the process lingers half-started
+        # and the front end keeps routing to it.
+        logging.exception(f"Shard {index} failed to start")
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+        raise
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+    finally:
+        await app.stop()
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def worker_main(index: int, queue, metrics_port: int):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    os.environ["SHARD_INDEX"] = str(index)
+    os.environ["BOT_MODE"] = "shard"
+    os.environ["METRICS_PORT"] = str(metrics_port + 1 + index) if metrics_port else "0"
+    asyncio.run(_serve_shard(index, queue))
+
+
+def run_sharded(shards: int, token: str, run_front, metrics_port: int = 0):
+    """Start `shards` worker processes and feed them from a routing front end.
+
+    `run_front(app)` runs the front Application (polling or webhook) and
+    returns once it has been stopped; workers then finish their queues.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queues = [ctx.Queue() for _ in range(shards)]
+
+    def start_worker(index: int):
+        worker = ctx.Process(target=worker_main, args=(index, queues[index], metrics_port),
+                             name=f"askzen-shard-{index}")
+        worker.start()
+        return worker
+
+    router = ShardRouter(queues, [start_worker(i) for i in range(shards)], start_worker)
+    front = ApplicationBuilder().token(token).concurrent_updates(False).build()
+    front.add_handler(TypeHandler(Update, router.route))
+    try:
+        run_front(front)
+    finally:
+        logging.info(f"Stopping shards, routed updates per shard: {router.routed}")
+        for queue in queues:
+            queue.put(None)
+        for worker in router.workers:
+            worker.join(30)
+            if worker.is_alive():
+                worker.terminate()
+    if router.failed:
+        raise RuntimeError(router.failed)
@@ -0,0 +1,80 @@
+import asyncio
+
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers with the same key.
+
+    Every waiter gets the same result or the same exception. A waiter being
+    cancelled does not cancel the shared call for the others; once the last
+    waiter is gone the call itself is cancelled.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._waiters = {}
+        self.coalesced = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._start(key, func(*args, **kwargs))
+        else:
+            self.coalesced += 1
+        return await self._wait(self._join(task))
+
+    async def do_many(self, keys: list, func, *args, **kwargs) -> list:
+        """do() for a call that answers several keys at once.
+
+        Keys already in flight join those calls; `func(fresh_keys, ...)` is
+        called once for the rest and must return one result per fresh key.
+        Each fresh key is in flight on its own from then on, so do() callers
+        join it too. Returns one result per key in `keys`.
+        """
+        tasks = {}
+        for key in keys:
+            if key not in tasks and key in self._calls:
+                tasks[key] = self._calls[key]
+                self.coalesced += 1
+        fresh = [key for key in dict.fromkeys(keys) if key not in tasks]
+        if fresh:
+            batch = asyncio.ensure_future(func(fresh, *args, **kwargs))
+            batch.add_done_callback(_consume)
+            for n, key in enumerate(fresh):
+                tasks[key] = self._start(key, self._pick(self._join(batch), n))
+        return list(await asyncio.gather(*(self._wait(self._join(tasks[key])) for key in keys)))
+
+    def _start(self, key, coro):
+        task = asyncio.ensure_future(coro)
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _join(self, task):
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        return task
+
+    async def _wait(self, task):
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    async def _pick(self, batch, n: int):
+        return (await self._wait(batch))[n]
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        _consume(task)
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def _consume(task):
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,368 @@
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+
+from tokens import estimate_tokens
+
+SESSION_OVERHEAD = 400
+
+
+class UserSession:
+    __slots__ = ("history", "history_tokens", "summary", "todos", "stats", "lang", "last_seen", "nbytes")
+
+    def __init__(self):
+        self.history = deque()
+        self.history_tokens = 0
+        self.summary = ""
+        self.todos = []
+        self.stats = 0
+        self.lang = None
+        self.last_seen = time.monotonic()
+        self.nbytes = SESSION_OVERHEAD
+
+    def to_record(self) -> dict:
+        return {
+            "lang": self.lang,
+            "stats": self.stats,
+            "history": [(role, content) for role, content, _ in self.history],
+            "summary": self.summary,
+            "todos": list(self.todos),
+        }
+
+    def restore(self, record: dict):
+        self.lang = record["lang"]
+        self.stats = record["stats"]
+        for role, content in record["history"]:
+            tokens = estimate_tokens(content)
+            self.history.append((role, content, tokens))
+            self.history_tokens += tokens
+        self.summary = record.get("summary") or ""
+        self.todos.extend(record["todos"])
+        self.nbytes = self.measure()
+
+    def merge(self, record: dict, cleared: set):
+        """Fold a stored record in under changes made before it was loaded."""
+        if self.lang is None:
+            self.lang = record["lang"]
+        self.stats += record["stats"]
+        if "history" not in cleared:
+            older = [(role, content, estimate_tokens(content)) for role, content in record["history"]]
+            self.history.extendleft(reversed(older))
+            self.history_tokens += sum(tokens for _, _, tokens in older)
+            self.summary = self.summary or record.get("summary") or ""
+        if "todos" not in cleared:
+            self.todos[:0] = record["todos"]
+
+    def measure(self) -> int:
+        size = SESSION_OVERHEAD
+        size += sys.getsizeof(self.summary)
+        for role, content, tokens in self.history:
+            size += sys.getsizeof(content) + 72
+        for item in self.todos:
+            size += sys.getsizeof(item) + 8
+        return size
+
+
+class SessionStore:
+    """Per-user state with idle expiry and a global LRU memory cap.
+
+    Sessions are kept in least-recently-used order, so idle eviction only has
+    to look at the front of the map and the memory cap drops the coldest users
+    first. Reads that do not need a session (language, stats) never create one.
+
+    With a storage backend, sessions are loaded lazily on first access and
+    changes are written behind in batches by flush(), which runs on a timer
+    and once more on shutdown. Evicted dirty sessions are kept until the next
+    flush so nothing is lost.
+
+    Nothing here reads the disk on the event loop: load() does it in a
+    thread. If a write reaches a user that is not in memory (evicted after
+    load()), a fresh session takes the write and the stored record is merged
+    in under it from a thread; until then the user is neither evicted nor
+    flushed.
+    """
+
+    def __init__(self, max_users: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 7 * 86400, history_budget: int = 1536, history_limit: int = 50,
+                 storage=None):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.history_budget = history_budget
+        self.history_limit = history_limit
+        self.total_bytes = 0
+        self.evictions = 0
+        self.storage = storage
+        self._sessions = OrderedDict()
+        self._dirty = set()
+        self._pending = {}
+        self._loading = {}
+        self._merges = set()
+        self._flush_task = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def peek(self, user_id: int):
+        """The in-memory (or not yet flushed) session, or None; never reads storage."""
+        session = self._sessions.get(user_id)
+        if session is None:
+            record = self._pending.get(user_id)
+            if record is not None:
+                session = self._insert(user_id, record)
+        return session
+
+    def get(self, user_id: int) -> UserSession:
+        now = time.monotonic()
+        self.evict_idle(now)
+        session = self.peek(user_id)
+        if session is None:
+            session = self._insert(user_id, None)
+            if self.storage is not None:
+                self._merge_stored(user_id)
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_seen = now
+        return session
+
+    async def load(self, user_id: int):
+        """Bring a user's session into memory without blocking the event loop.
+
+        Runs for every update, so it also marks the user as active: read-only
+        commands keep a session from being evicted as idle.
+        """
+        if user_id not in self._sessions:
+            record = self._pending.get(user_id)
+            if record is None and self.storage is not None:
+                record = await asyncio.to_thread(self.storage.load, user_id)
+            if user_id not in self._sessions:
+                self._insert(user_id, record)
+                return
+        self._sessions.move_to_end(user_id)
+        self._sessions[user_id].last_seen = time.monotonic()
+
+    def _merge_stored(self, user_id: int):
+        self._loading[user_id] = set()
+        task = asyncio.get_running_loop().create_task(self._merge(user_id))
+        self._merges.add(task)
+        task.add_done_callback(self._merges.discard)
+
+    async def _merge(self, user_id: int):
+        try:
+            record = await asyncio.to_thread(self.storage.load, user_id)
+        except Exception:
+            logging.exception("Session load failed")
+            record = None
+        cleared = self._loading.pop(user_id, set())
+        session = self._sessions.get(user_id)
+        if record is not None and session is not None:
+            session.merge(record, cleared)
+            self._changed(user_id, session)
+
+    def _insert(self, user_id: int, record) -> UserSession:
+        session = UserSession()
+        if record is not None:
+            session.restore(record)
+        self._sessions[user_id] = session
+        self.total_bytes += session.nbytes
+        self._enforce_limits(user_id)
+        return session
+
+    def _changed(self, user_id: int, session: UserSession):
+        size = session.measure()
+        self.total_bytes += size - session.nbytes
+        session.nbytes = size
+        self._dirty.add(user_id)
+        self._enforce_limits(user_id)
+
+    def _drop(self, user_id: int):
+        session = self._sessions.pop(user_id)
+        self.total_bytes -= session.nbytes
+        self.evictions += 1
+        if user_id in self._dirty:
+            self._dirty.discard(user_id)
+            if self.storage is not None:
+                self._pending[user_id] = session.to_record()
+
+    def _enforce_limits(self, keep_user_id: int):
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_users or self.total_bytes > self.max_bytes
+        ):
+            for oldest in self._sessions:
+                if oldest != keep_user_id and oldest not in self._loading:
+                    break
+            else:
+                return
+            self._drop(oldest)
+
+    def evict_idle(self, now: float = None) -> int:
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.idle_ttl or user_id in self._loading:
+                break
+            self._drop(user_id)
+            evicted += 1
+        return evicted
+
+    def lang(self, user_id: int, default: str = "en"):
+        session = self.peek(user_id)
+        if session is None or session.lang is None:
+            return default
+        return session.lang
+
+    def set_lang(self, user_id: int, lang: str):
+        session = self.get(user_id)
+        if session.lang != lang:
+            session.lang = lang
+            self._dirty.add(user_id)
+
+    def history(self, user_id: int, budget: int = None) -> list:
+        """Most recent turns that fit in `budget` tokens, oldest first.
+
+        The rolling summary of older turns, if any, comes first as a system
+        message and counts against the budget. The newest turn is always kept.
+        """
+        session = self.peek(user_id)
+        if session is None:
+            return []
+        budget = self.history_budget if budget is None else budget
+        messages = []
+        used = 0
+        if session.summary:
+            used = estimate_tokens(session.summary)
+        for role, content, tokens in reversed(session.history):
+            if messages and used + tokens > budget:
+                break
+            messages.append({"role": role, "content": content})
+            used += tokens
+        messages.reverse()
+        if session.summary:
+            messages.insert(0, {"role": "system", "content": f"Summary of the earlier conversation: {session.summary}"})
+        return messages
+
+    def add_history(self, user_id: int, role: str, content: str) -> list:
+        """Append a turn and trim to the token budget; returns the dropped turns."""
+        session = self.get(user_id)
+        tokens = estimate_tokens(content)
+        session.history.append((role, content, tokens))
+        session.history_tokens += tokens
+        dropped = []
+        while len(session.history) > 1 and (
+            session.history_tokens > self.history_budget or len(session.history) > self.history_limit
+        ):
+            old_role, old_content, old_tokens = session.history.popleft()
+            session.history_tokens -= old_tokens
+            dropped.append({"role": old_role, "content": old_content})
+        self._changed(user_id, session)
+        return dropped
+
+    def clear_history(self, user_id: int):
+        session = self.get(user_id)
+        session.history.clear()
+        session.history_tokens = 0
+        session.summary = ""
+        if user_id in self._loading:
+            self._loading[user_id].add("history")
+        self._changed(user_id, session)
+
+    def summary(self, user_id: int) -> str:
+        session = self.peek(user_id)
+        return session.summary if session else ""
+
+    def set_summary(self, user_id: int, summary: str):
+        session = self.get(user_id)
+        session.summary = summary
+        self._changed(user_id, session)
+
+    def todos(self, user_id: int) -> list:
+        session = self.peek(user_id)
+        return list(session.todos) if session else []
+
+    def add_todo(self, user_id: int, item: str):
+        session = self.get(user_id)
+        session.todos.append(item)
+        self._changed(user_id, session)
+
+    def clear_todos(self, user_id: int):
+        session = self.get(user_id)
+        session.todos.clear()
+        if user_id in self._loading:
+            self._loading[user_id].add("todos")
+        self._changed(user_id, session)
+
+    def stats(self, user_id: int) -> int:
+        session = self.peek(user_id)
+        return session.stats if session else 0
+
+    def increment_stat(self, user_id: int):
+        self.get(user_id).stats += 1
+        self._dirty.add(user_id)
+
+    async def flush(self) -> int:
+        if self.storage is None or not (self._dirty or self._pending):
+            return 0
+        records = self._pending
+        self._pending = {}
+        waiting = set()
+        for user_id in self._dirty:
+            session = self._sessions.get(user_id)
+            if user_id in self._loading:
+                waiting.add(user_id)
+            elif session is not None:
+                records[user_id] = session.to_record()
+        self._dirty = waiting
+        try:
+            await asyncio.to_thread(self.storage.save_many, records)
+        except Exception:
+            logging.exception("Session flush failed")
+            records.update(self._pending)
+            self._pending = records
+            raise
+        return len(records)
+
+    async def _flush_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                pass
+
+    def start(self, interval: float = 5.0):
+        if self.storage is not None and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop(interval))
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await asyncio.gather(*self._merges, return_exceptions=True)
+        await self.flush()
+        if self.storage is not None:
+            self.storage.close()
+
+    def active_users(self, window: float) -> int:
+        cutoff = time.monotonic() - window
+        count = 0
+        for session in reversed(self._sessions.values()):
+            if session.last_seen < cutoff:
+                break
+            count += 1
+        return count
+
+    def memory_usage(self) -> dict:
+        return {
+            "users": len(self._sessions),
+            "bytes": self.total_bytes,
+            "max_users": self.max_users,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "dirty": len(self._dirty) + len(self._pending),
+        }
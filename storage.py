@@ -0,0 +1,61 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class SQLiteStorage:
+    """Durable per-user records in a WAL-mode SQLite file.
+
+    Methods are blocking; SessionStore calls them from a worker thread so the
+    event loop never waits on disk.
+    """
+
+    def __init__(self, path: str = "askzen.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id INTEGER PRIMARY KEY, lang TEXT, stats INTEGER NOT NULL DEFAULT 0, "
+            "history TEXT NOT NULL DEFAULT '[]', summary TEXT NOT NULL DEFAULT '', todos TEXT NOT NULL DEFAULT '[]', updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        if "summary" not in columns:
+            self._conn.execute("ALTER TABLE users ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def load(self, user_id: int):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lang, stats, history, summary, todos FROM users WHERE user_id=?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "lang": row[0],
+            "stats": row[1],
+            "history": [tuple(item) for item in json.loads(row[2])],
+            "summary": row[3],
+            "todos": json.loads(row[4]),
+        }
+
+    def save_many(self, records: dict):
+        now = time.time()
+        rows = [
+            (user_id, r["lang"], r["stats"], json.dumps(r["history"], ensure_ascii=False), r["summary"],
+             json.dumps(r["todos"], ensure_ascii=False), now)
+            for user_id, r in records.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, lang, stats, history, summary, todos, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from sender import TELEGRAM_MAX_LENGTH, split_text
+
+PLACEHOLDER = "…"
+
+
+class ProgressiveReply:
+    """Show a streamed LLM answer by editing one Telegram message in place.
+
+    Edits are coalesced: a new edit goes out only when at least `min_interval`
+    seconds have passed since the last one and `min_chars` new characters have
+    arrived. Edits draw on the outbox's chat and global buckets like sends do;
+    an intermediate edit is skipped rather than delayed when they are empty,
+    and only the final one waits. Answers longer than one message continue in
+    follow-up messages sent via `outbox`.
+    """
+
+    def __init__(self, message, outbox, min_interval: float = 1.0, min_chars: int = 30):
+        self.message = message
+        self.outbox = outbox
+        self.min_interval = min_interval
+        self.min_chars = min_chars
+        self.text = ""
+        self.sent = None
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def start(self):
+        self.sent = await self.outbox.reply(self.message, PLACEHOLDER, mergeable=False)
+        self._last_edit = time.monotonic()
+
+    async def consume(self, chunks) -> str:
+        if self.sent is None:
+            await self.start()
+        async for delta in chunks:
+            self.text += delta
+            if self._due():
+                await self._edit(self.text + " " + PLACEHOLDER)
+        self.text = self.text.strip()
+        parts = split_text(self.text)
+        await self._edit(parts[0], final=True)
+        for part in parts[1:]:
+            await self.outbox.reply(self.message, part, mergeable=False)
+        return self.text
+
+    async def fail(self, error_text: str):
+        if self.sent is None:
+            await self.outbox.reply(self.message, error_text)
+        elif self.text:
+            await self._edit(self.text + "\n\n" + error_text, final=True)
+        else:
+            await self._edit(error_text, final=True)
+
+    def _due(self) -> bool:
+        if len(self.text) - len(self._shown) < self.min_chars:
+            return False
+        return time.monotonic() - self._last_edit >= self.min_interval
+
+    async def _edit(self, text: str, final: bool = False):
+        text = text.strip()[:TELEGRAM_MAX_LENGTH] or PLACEHOLDER
+        if text == self._shown:
+            return
+        try:
+            if await self.outbox.edit(self.sent, text, wait=final) is not None:
+                self._shown = text
+        except RetryAfter as e:
+            if final:
+                await asyncio.sleep(e.retry_after)
+                return await self._edit(text, final)
+            self._last_edit = time.monotonic() + e.retry_after
+            return
+        except BadRequest:
+            pass
+        self._last_edit = time.monotonic()
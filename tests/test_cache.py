@@ -0,0 +1,25 @@
+import asyncio
+
+from cache import MemoryCache, make_key
+
+
+def test_key_collapses_whitespace_only():
+    assert make_key("define", "m", "p", "  polish\n") == make_key("define", "m", "p", "polish")
+    assert make_key("define", "m", "p", "Polish") != make_key("define", "m", "p", "polish")
+
+
+def test_key_casefolds_target():
+    assert make_key("translate", "m", "p", "Apple", "DE") == make_key("translate", "m", "p", "Apple", "de")
+    assert make_key("translate", "m", "p", "Apple", "de") != make_key("translate", "m", "p", "apple", "de")
+
+
+def test_recheck_turns_a_counted_miss_into_a_hit():
+    async def main():
+        cache = MemoryCache()
+        assert await cache.get("k") is None
+        await cache.set("k", "v")
+        assert await cache.get("k", recheck=True) == "v"
+        assert await cache.get("x", recheck=True) is None
+        return cache.stats()
+
+    assert asyncio.run(main()) == {"hits": 1, "misses": 0, "hit_rate": 1.0}
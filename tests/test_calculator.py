@@ -0,0 +1,48 @@
+import pytest
+
+from calculator import MAX_EXPRESSION_CHARS, CalcError, evaluate
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2+3*4", 14),
+    ("(1+2)**10", 59049),
+    ("2/4", 0.5),
+    ("-3//2", -2),
+    ("7 % 3", 1),
+    ("-(2+3)", -5),
+    ("2**0.5", 2 ** 0.5),
+    ("0.5**100000", 0.0),
+    ("2**1023", 2 ** 1023),
+])
+def test_arithmetic(expression, expected):
+    assert evaluate(expression) == expected
+
+
+def test_long_left_associative_chain():
+    expression = "+".join(["1"] * 40)
+    assert evaluate(expression) == 40
+    assert evaluate("+".join(["1"] * (MAX_EXPRESSION_CHARS // 2))) == MAX_EXPRESSION_CHARS // 2
+
+
+@pytest.mark.parametrize("expression", [
+    "9**9**9",
+    "2**1024",
+    "10**300*10**300",
+    "1e308*10",
+    "(-8)**0.5",
+    "__import__('os')",
+    "abs(1)",
+    "1 if 1 else 2",
+    "True+1",
+    "1j*2",
+    "2+",
+    "1" * (MAX_EXPRESSION_CHARS + 1),
+])
+def test_rejected(expression):
+    with pytest.raises(CalcError):
+        evaluate(expression)
+
+
+def test_division_by_zero():
+    with pytest.raises(ZeroDivisionError):
+        evaluate("1/0")
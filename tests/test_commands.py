@@ -0,0 +1,13 @@
+from commands import Command, text
+
+
+def test_command_messages():
+    command = Command("stats", messages={"count": {"tr": "Toplam {count} istek.", "en": "{count} requests."}})
+    assert command.text("count", "tr", count=3) == "Toplam 3 istek."
+    assert command.text("count", "de", count=3) == "3 requests."
+    assert command.text("busy", "tr") == text("busy", "tr")
+
+
+def test_shared_messages_format():
+    assert "5" in text("batch_limit", "en", limit=5)
+    assert text("chat_error", "xx") == text("chat_error", "en")
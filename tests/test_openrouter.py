@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from openrouter import CircuitOpenError, OpenRouterClient, OpenRouterError
+
+
+def half_open_client() -> OpenRouterClient:
+    client = OpenRouterClient("key", models=["m"], breaker_threshold=1)
+    breaker = client.breaker("m")
+    breaker.record_failure()
+    breaker.opened_at -= breaker.recovery_timeout
+    return client
+
+
+def test_half_open_model_gets_a_single_probe():
+    async def main():
+        client = half_open_client()
+        gate = asyncio.Event()
+        calls = []
+
+        async def call(model):
+            calls.append(model)
+            await gate.wait()
+            return "ok"
+
+        probe = asyncio.ensure_future(client._with_fallback(["m"], call))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await client._with_fallback(["m"], call)
+        gate.set()
+        assert await probe == "ok"
+        assert calls == ["m"]
+        assert client.breaker("m").state == "closed"
+
+    asyncio.run(main())
+
+
+def test_probe_is_released_when_it_ends_without_a_verdict():
+    async def main():
+        client = half_open_client()
+
+        async def bad_request(model):
+            raise OpenRouterError("bad request", 400)
+
+        with pytest.raises(OpenRouterError):
+            await client._attempt("m", bad_request)
+        breaker = client.breaker("m")
+        assert breaker.state == "half_open" and breaker.available()
+
+    asyncio.run(main())
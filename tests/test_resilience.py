@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, backoff_delay, hedged
+
+
+def open_breaker(recovery_timeout: float = 30.0) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=recovery_timeout)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = open_breaker()
+    breaker.opened_at -= breaker.recovery_timeout
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = open_breaker()
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = half_open_breaker()
+    assert breaker.available()
+    assert breaker.allow()
+    assert not breaker.available()
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+
+def test_half_open_probe_success_closes():
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    breaker.opened_at -= breaker.recovery_timeout
+    assert breaker.allow()
+
+
+def test_released_probe_can_be_retried():
+    breaker = half_open_breaker()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_backoff_honours_retry_after():
+    assert backoff_delay(5, retry_after=7.0) == 7.0
+    assert 0 <= backoff_delay(10, base=0.5, cap=4.0) <= 4.0
+
+
+class Call:
+    def __init__(self, delay: float, result=None, error=None):
+        self.delay = delay
+        self.result = result
+        self.error = error
+        self.started = False
+        self.cancelled = False
+
+    async def __call__(self):
+        self.started = True
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_hedged_fast_primary_skips_second():
+    first, second = Call(0.01, "first"), Call(0.01, "second")
+    assert asyncio.run(hedged(first, second, 0.2)) == "first"
+    assert not second.started
+
+
+def test_hedged_second_wins_and_primary_is_cancelled():
+    first, second = Call(1.0, "first"), Call(0.01, "second")
+    assert asyncio.run(hedged(first, second, 0.02)) == "second"
+    assert first.cancelled
+
+
+def test_hedged_primary_failure_starts_second_at_once():
+    first, second = Call(0.0, error=ValueError("first")), Call(0.01, "second")
+    assert asyncio.run(hedged(first, second, 5.0)) == "second"
+
+
+def test_hedged_raises_primary_error_when_both_fail():
+    first, second = Call(0.03, error=ValueError("first")), Call(0.01, error=KeyError("second"))
+    with pytest.raises(ValueError, match="first"):
+        asyncio.run(hedged(first, second, 0.01))
+
+
+def test_hedged_discards_losing_success():
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        a, b = loop.create_future(), loop.create_future()
+
+        async def first():
+            return await a
+
+        async def second():
+            return await b
+
+        task = asyncio.ensure_future(hedged(first, second, 0.01, discard))
+        await asyncio.sleep(0.05)
+        a.set_result("a")
+        b.set_result("b")
+        return await task
+
+    result = asyncio.run(main())
+    assert len(discarded) == 1
+    assert {result, *discarded} == {"a", "b"}
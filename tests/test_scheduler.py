@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from scheduler import FairScheduler, RateLimited, SchedulerBusy, Superseded
+
+
+def make_scheduler(**kwargs) -> FairScheduler:
+    options = {"max_concurrent": 1, "max_queue": 10, "max_pending_per_user": 5, "rate": 100.0, "burst": 100}
+    options.update(kwargs)
+    return FairScheduler(**options)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_are_shared_round_robin_across_users():
+    order = []
+
+    async def job(scheduler, user_id, label, hold):
+        async with scheduler.slot(user_id):
+            order.append(label)
+            await hold.wait()
+
+    async def main():
+        scheduler = make_scheduler()
+        hold = asyncio.Event()
+        first = asyncio.ensure_future(job(scheduler, 1, "a0", hold))
+        await settle()
+        tasks = [asyncio.ensure_future(job(scheduler, 1, f"a{n}", hold)) for n in (1, 2, 3)]
+        await settle()
+        tasks.append(asyncio.ensure_future(job(scheduler, 2, "b1", hold)))
+        await settle()
+        hold.set()
+        await asyncio.gather(first, *tasks)
+        assert scheduler.active == 0 and scheduler.queued == 0
+
+    asyncio.run(main())
+    assert order == ["a0", "a1", "b1", "a2", "a3"]
+
+
+def test_background_work_waits_for_user_requests():
+    order = []
+
+    async def job(scheduler, user_id, label, hold, background=False):
+        async with scheduler.slot(user_id, background=background):
+            order.append(label)
+            await hold.wait()
+
+    async def main():
+        scheduler = make_scheduler()
+        hold = asyncio.Event()
+        first = asyncio.ensure_future(job(scheduler, 1, "user", hold))
+        await settle()
+        summary = asyncio.ensure_future(job(scheduler, 1, "summary", hold, background=True))
+        await settle()
+        other = asyncio.ensure_future(job(scheduler, 2, "other", hold))
+        await settle()
+        hold.set()
+        await asyncio.gather(first, summary, other)
+
+    asyncio.run(main())
+    assert order == ["user", "other", "summary"]
+
+
+def test_supersede_cancels_queued_requests_of_the_same_kind():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.acquire(9)
+        old = asyncio.ensure_future(scheduler.acquire(1, "chat", supersede=True))
+        other = asyncio.ensure_future(scheduler.acquire(1, "define"))
+        await settle()
+        new = asyncio.ensure_future(scheduler.acquire(1, "chat", supersede=True))
+        await settle()
+        with pytest.raises(Superseded):
+            await old
+        assert scheduler.superseded == 1
+        assert scheduler.queued == 2
+        scheduler.release()
+        await other
+        scheduler.release()
+        await new
+        scheduler.release()
+        assert scheduler.active == 0 and scheduler.queued == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.acquire(1)
+        waiter = asyncio.ensure_future(scheduler.acquire(2))
+        await settle()
+        assert scheduler.queued == 1
+        waiter.cancel()
+        await settle()
+        assert scheduler.queued == 0
+        scheduler.release()
+        assert scheduler.active == 0
+
+    asyncio.run(main())
+
+
+def test_waiter_cancelled_after_grant_releases_its_slot():
+    async def main():
+        scheduler = make_scheduler()
+        await scheduler.acquire(1)
+        waiter = asyncio.ensure_future(scheduler.acquire(2))
+        await settle()
+        scheduler.release()
+        assert scheduler.active == 1
+        waiter.cancel()
+        await settle()
+        assert scheduler.active == 0 and scheduler.queued == 0
+
+    asyncio.run(main())
+
+
+def test_full_queues_and_empty_buckets_are_rejected():
+    async def main():
+        scheduler = make_scheduler(max_pending_per_user=1)
+        await scheduler.acquire(1)
+        waiter = asyncio.ensure_future(scheduler.acquire(2))
+        await settle()
+        with pytest.raises(SchedulerBusy):
+            await scheduler.acquire(2)
+        waiter.cancel()
+        limited = make_scheduler(max_concurrent=10, rate=0.001, burst=1)
+        await limited.acquire(3)
+        with pytest.raises(RateLimited):
+            await limited.acquire(3)
+        assert limited.rejected == 1
+
+    asyncio.run(main())
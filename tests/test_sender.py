@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from telegram.error import NetworkError, TimedOut
+
+from sender import Outbox
+
+
+class FlakyBot:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, reply_to_message_id=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error
+        return text
+
+
+def test_network_error_is_retried():
+    bot = FlakyBot(NetworkError("connection reset"))
+    assert asyncio.run(Outbox().send(bot, 1, "hi")) == "hi"
+    assert bot.calls == 2
+
+
+def test_timed_out_is_not_retried():
+    bot = FlakyBot(TimedOut())
+    with pytest.raises(TimedOut):
+        asyncio.run(Outbox().send(bot, 1, "hi"))
+    assert bot.calls == 1
+
+
+def test_edits_draw_on_the_chat_bucket():
+    class Chat:
+        id = 1
+        type = "private"
+
+    class Message:
+        chat = Chat()
+
+        def __init__(self):
+            self.edits = []
+
+        async def edit_text(self, text):
+            self.edits.append(text)
+            return text
+
+    async def main():
+        outbox = Outbox(private_rate=100.0, burst=2)
+        message = Message()
+        await outbox.edit(message, "a")
+        await outbox.edit(message, "b")
+        bucket = outbox._chat(1, "private").bucket
+        assert bucket.tokens < 1
+        await outbox.edit(message, "c")
+        return message.edits, outbox.edited
+
+    assert asyncio.run(main()) == (["a", "b", "c"], 3)
+
+
+def test_edit_without_wait_is_skipped_when_the_bucket_is_empty():
+    class Chat:
+        id = 2
+        type = "group"
+
+    class Message:
+        chat = Chat()
+
+        async def edit_text(self, text):
+            return text
+
+    async def main():
+        outbox = Outbox(group_rate=0.01, burst=1)
+        assert await outbox.edit(Message(), "a", wait=False) == "a"
+        assert await outbox.edit(Message(), "b", wait=False) is None
+        return outbox.edited
+
+    assert asyncio.run(main()) == 1
@@ -0,0 +1,66 @@
+import asyncio
+
+from sharding import ShardRouter, shard_for
+
+
+class Worker:
+    def __init__(self, alive: bool = True):
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self):
+        return self.alive
+
+
+class Queue(list):
+    put = list.append
+
+
+class FakeUpdate:
+    update_id = 7
+
+    def __init__(self, user_id):
+        self.effective_user = type("User", (), {"id": user_id})()
+
+    def to_dict(self):
+        return {"user": self.effective_user.id}
+
+
+def make_router(workers, **kwargs):
+    started = []
+    stopped = []
+
+    def start_worker(index):
+        started.append(index)
+        return Worker()
+
+    router = ShardRouter([Queue() for _ in workers], workers, start_worker, stop_front=lambda: stopped.append(1),
+                         **kwargs)
+    return router, started, stopped
+
+
+def test_routes_by_user():
+    router, _, _ = make_router([Worker(), Worker()])
+    for user_id in (1, 2, 3):
+        asyncio.run(router.route(FakeUpdate(user_id), None))
+    assert router.queues[shard_for(1, 2)] == [{"user": 1}, {"user": 3}]
+    assert router.routed == [1, 2]
+
+
+def test_dead_worker_is_restarted_and_keeps_its_queue():
+    router, started, stopped = make_router([Worker(), Worker(alive=False)])
+    asyncio.run(router.route(FakeUpdate(1), None))
+    assert started == [1]
+    assert router.workers[1].is_alive()
+    assert router.queues[1] == [{"user": 1}]
+    assert not stopped
+
+
+def test_crash_looping_worker_stops_the_front_end():
+    router, started, stopped = make_router([Worker(alive=False)], max_restarts=2)
+    router.start_worker = lambda index: started.append(index) or Worker(alive=False)
+    for _ in range(4):
+        asyncio.run(router.route(FakeUpdate(1), None))
+    assert started == [0, 0]
+    assert stopped == [1]
+    assert router.failed and router.routed == [2]
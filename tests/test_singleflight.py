@@ -0,0 +1,134 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def test_do_shares_one_call():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("a", fetch, "a") for _ in range(5)))
+        assert results == ["A"] * 5
+        assert calls == ["a"]
+        assert flight.coalesced == 4
+        assert len(flight) == 0
+
+    asyncio.run(main())
+
+
+def test_do_many_joins_in_flight_keys_and_shares_fresh_ones():
+    batches = []
+
+    async def fetch_one(key):
+        await asyncio.sleep(0.02)
+        return f"one:{key}"
+
+    async def fetch_many(keys):
+        batches.append(list(keys))
+        await asyncio.sleep(0.01)
+        return [f"many:{key}" for key in keys]
+
+    async def main():
+        flight = SingleFlight()
+        single = asyncio.ensure_future(flight.do("a", fetch_one, "a"))
+        await asyncio.sleep(0)
+        many = asyncio.ensure_future(flight.do_many(["a", "b", "c"], fetch_many))
+        await asyncio.sleep(0)
+        late = await flight.do("c", fetch_one, "c")
+        assert await many == ["one:a", "many:b", "many:c"]
+        assert await single == "one:a"
+        assert late == "many:c"
+        assert batches == [["b", "c"]]
+        assert len(flight) == 0
+
+    asyncio.run(main())
+
+
+def test_do_many_error_reaches_every_key():
+    async def fail(keys):
+        raise ValueError("upstream")
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do_many(["a", "b"], fail), return_exceptions=True)
+        assert isinstance(results[0], ValueError)
+        assert len(flight) == 0
+
+    asyncio.run(main())
+
+
+def test_cancelling_one_waiter_keeps_the_call_for_the_others():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("k", slow))
+        second = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+        assert first.cancelled()
+
+    asyncio.run(main())
+
+
+def test_call_is_cancelled_after_the_last_waiter():
+    state = {}
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def main():
+        flight = SingleFlight()
+        waiters = [asyncio.ensure_future(flight.do("k", slow)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert len(flight) == 0
+
+    asyncio.run(main())
+    assert state == {"cancelled": True}
+
+
+def test_batch_is_cancelled_after_its_last_waiter():
+    state = {}
+
+    async def slow(keys):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return keys
+
+    async def main():
+        flight = SingleFlight()
+        many = asyncio.ensure_future(flight.do_many(["a", "b"], slow))
+        await asyncio.sleep(0)
+        single = asyncio.ensure_future(flight.do("a", slow))
+        await asyncio.sleep(0)
+        many.cancel()
+        await asyncio.sleep(0.01)
+        assert "cancelled" not in state
+        single.cancel()
+        await asyncio.gather(many, single, return_exceptions=True)
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert len(flight) == 0
+
+    asyncio.run(main())
+    assert state == {"cancelled": True}
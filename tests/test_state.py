@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from state import SessionStore
+
+
+def test_load_keeps_reading_users_active():
+    async def main():
+        store = SessionStore(idle_ttl=0.2)
+        await store.load(1)
+        store.add_todo(1, "milk")
+        for _ in range(4):
+            await asyncio.sleep(0.1)
+            await store.load(1)
+            assert store.todos(1) == ["milk"]
+        store.add_todo(2, "bread")
+        assert 1 in store
+        assert store.active_users(0.15) == 2
+
+    asyncio.run(main())
+
+
+def test_load_moves_user_to_lru_end():
+    async def main():
+        store = SessionStore(max_users=2)
+        await store.load(1)
+        await store.load(2)
+        await store.load(1)
+        await store.load(3)
+        assert 1 in store and 2 not in store
+
+    asyncio.run(main())
+
+
+def test_idle_sessions_are_evicted():
+    store = SessionStore(idle_ttl=60)
+    store.add_todo(1, "milk")
+    assert store.evict_idle(time.monotonic() + 61) == 1
+    assert store.todos(1) == []
@@ -0,0 +1,94 @@
+import asyncio
+
+from state import SessionStore
+from storage import SQLiteStorage
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def write():
+        store = SessionStore(storage=SQLiteStorage(path))
+        await store.load(1)
+        store.set_lang(1, "tr")
+        store.add_history(1, "user", "merhaba")
+        store.add_history(1, "assistant", "selam")
+        store.set_summary(1, "greetings")
+        store.add_todo(1, "süt al")
+        store.increment_stat(1)
+        assert await store.flush() == 1
+        await store.stop()
+
+    async def read():
+        store = SessionStore(storage=SQLiteStorage(path))
+        assert store.peek(1) is None
+        await store.load(1)
+        assert store.lang(1) == "tr"
+        assert store.stats(1) == 1
+        assert store.todos(1) == ["süt al"]
+        assert store.summary(1) == "greetings"
+        assert [m["content"] for m in store.history(1)][1:] == ["merhaba", "selam"]
+        await store.stop()
+
+    run(write())
+    run(read())
+
+
+def test_evicted_dirty_session_is_flushed(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def write():
+        store = SessionStore(max_users=1, storage=SQLiteStorage(path))
+        await store.load(1)
+        store.add_todo(1, "first")
+        await store.load(2)
+        assert 1 not in store
+        store.add_todo(2, "second")
+        assert store.memory_usage()["dirty"] == 2
+        assert await store.flush() == 2
+        await store.stop()
+
+    async def read():
+        store = SessionStore(storage=SQLiteStorage(path))
+        await store.load(1)
+        await store.load(2)
+        assert store.todos(1) == ["first"]
+        assert store.todos(2) == ["second"]
+        await store.stop()
+
+    run(write())
+    run(read())
+
+
+def test_write_before_load_merges_stored_record(tmp_path):
+    path = str(tmp_path / "sessions.db")
+
+    async def seed():
+        store = SessionStore(storage=SQLiteStorage(path))
+        await store.load(1)
+        store.set_lang(1, "tr")
+        store.add_todo(1, "old")
+        store.increment_stat(1)
+        await store.stop()
+
+    async def write():
+        store = SessionStore(storage=SQLiteStorage(path))
+        store.add_todo(1, "new")
+        store.increment_stat(1)
+        await store.stop()
+
+    async def read():
+        store = SessionStore(storage=SQLiteStorage(path))
+        await store.load(1)
+        assert store.lang(1) == "tr"
+        assert store.todos(1) == ["old", "new"]
+        assert store.stats(1) == 2
+        await store.stop()
+
+    run(seed())
+    run(write())
+    run(read())
@@ -0,0 +1,67 @@
+import asyncio
+
+from updates import PerUserUpdateProcessor
+
+
+class FakeUpdate:
+    def __init__(self, user_id):
+        self.effective_user = type("User", (), {"id": user_id})() if user_id else None
+
+
+def test_one_users_updates_run_in_order_and_others_concurrently():
+    log = []
+
+    async def handle(name, delay):
+        log.append(f"start {name}")
+        await asyncio.sleep(delay)
+        log.append(f"end {name}")
+
+    async def main():
+        processor = PerUserUpdateProcessor(8)
+        await asyncio.gather(
+            processor.process_update(FakeUpdate(1), handle("a1", 0.03)),
+            processor.process_update(FakeUpdate(1), handle("a2", 0.0)),
+            processor.process_update(FakeUpdate(2), handle("b1", 0.01)),
+        )
+        assert processor._queues == {}
+
+    asyncio.run(main())
+    assert log.index("end a1") < log.index("start a2")
+    assert log.index("start b1") < log.index("end a1")
+
+
+def test_queued_updates_do_not_hold_slots():
+    log = []
+
+    async def handle(name, delay):
+        await asyncio.sleep(delay)
+        log.append(name)
+
+    async def main():
+        processor = PerUserUpdateProcessor(2)
+        first = [processor.process_update(FakeUpdate(1), handle(f"a{n}", 0.02)) for n in range(4)]
+        other = processor.process_update(FakeUpdate(2), handle("b", 0.0))
+        await asyncio.gather(*first, other)
+
+    asyncio.run(main())
+    assert log[0] == "b"
+    assert log[1:] == ["a0", "a1", "a2", "a3"]
+
+
+def test_failed_update_does_not_stop_the_users_queue():
+    log = []
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def ok():
+        log.append("ok")
+
+    async def main():
+        processor = PerUserUpdateProcessor(4)
+        await asyncio.gather(processor.process_update(FakeUpdate(1), fail()),
+                             processor.process_update(FakeUpdate(1), ok()),
+                             processor.process_update(FakeUpdate(None), ok()))
+
+    asyncio.run(main())
+    assert log == ["ok", "ok"]
@@ -0,0 +1,21 @@
+MESSAGE_OVERHEAD = 4
+DEFAULT_CONTEXT_TOKENS = 4096
+MODEL_CONTEXT_TOKENS = {
+    "mistralai/mistral-7b-instruct": 8192,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII chars per token, ~2 for other scripts."""
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return MESSAGE_OVERHEAD + (len(text) - non_ascii) // 4 + non_ascii // 2
+
+
+def history_budget(model: str, max_tokens: int, share: float = 0.25) -> int:
+    """Tokens of conversation history to send with a request to `model`.
+
+    Only a share of the context window is used so request size (and upstream
+    latency) stays predictable even for models with very large windows.
+    """
+    context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    return max(256, int((context - max_tokens) * share))
@@ -0,0 +1,47 @@
+import logging
+from collections import deque
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently across users but in order for each user.
+
+    An update from a user whose previous update is still running is queued
+    behind it and gives its concurrency slot back at once; the running update
+    then works through the user's queue. So one user's handlers never
+    interleave (history, to-dos and replies stay in message order) and a
+    user holds at most one of the `max_concurrent_updates` slots.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._queues = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            await coroutine
+            return
+        queue = self._queues.get(user.id)
+        if queue is not None:
+            queue.append(coroutine)
+            return
+        queue = self._queues[user.id] = deque([coroutine])
+        try:
+            while queue:
+                try:
+                    await queue[0]
+                except Exception:
+                    logging.exception(f"Update from user {user.id} failed")
+                queue.popleft()
+        finally:
+            del self._queues[user.id]
+            for pending in queue:
+                pending.close()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
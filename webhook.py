@@ -0,0 +1,123 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+import tornado.httpserver
+import tornado.web
+from telegram import Update
+
+import metrics
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramUpdateHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_app, secret_token: str, state: dict):
+        self.bot_app = bot_app
+        self.secret_token = secret_token
+        self.state = state
+
+    async def post(self):
+        if self.state["draining"]:
+            self.set_status(503)
+            return
+        token = self.request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.set_status(403)
+            return
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        update = Update.de_json(data, self.bot_app.bot)
+        await self.bot_app.update_queue.put(update)
+        self.set_status(200)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_app, state: dict):
+        self.bot_app = bot_app
+        self.state = state
+
+    def get(self):
+        healthy = self.bot_app.running and not self.state["draining"]
+        self.set_status(200 if healthy else 503)
+        self.write({
+            "status": "ok" if healthy else "draining",
+            "pending_updates": self.bot_app.update_queue.qsize(),
+        })
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.REGISTRY.render())
+
+
+def start_metrics_server(listen: str, port: int):
+    server = tornado.httpserver.HTTPServer(tornado.web.Application([(r"/metrics", MetricsHandler)]))
+    server.listen(port, address=listen)
+    logging.info(f"Metrics server listening on {listen}:{port}")
+    return server
+
+
+def build_web_app(application, url_path: str, secret_token: str, state: dict, extra_routes=()):
+    return tornado.web.Application([
+        (f"/{url_path.strip('/')}", TelegramUpdateHandler,
+         {"bot_app": application, "secret_token": secret_token, "state": state}),
+        (r"/health", HealthHandler, {"bot_app": application, "state": state}),
+        *extra_routes,
+    ])
+
+
+async def serve_webhook(application, listen: str, port: int, url_path: str, webhook_url: str,
+                        secret_token: str, drain_timeout: float = 25.0, max_connections: int = 40,
+                        extra_routes=()):
+    """Receive updates over HTTP until SIGTERM/SIGINT, then drain and stop.
+
+    The webhook is registered on startup and left in place on shutdown, so
+    updates that arrive during a restart are queued by Telegram rather than
+    lost. Sessions are cached in memory and written back whole, so exactly
+    one instance may serve a given database; scale out with SHARDS instead
+    of a load balancer in front of several instances.
+    """
+    state = {"draining": False}
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=secret_token,
+        allowed_updates=Update.ALL_TYPES,
+        max_connections=max_connections,
+    )
+    await application.start()
+    server = tornado.httpserver.HTTPServer(
+        build_web_app(application, url_path, secret_token, state, extra_routes), xheaders=True
+    )
+    server.listen(port, address=listen)
+    logging.info(f"Webhook server listening on {listen}:{port}")
+    try:
+        await stop.wait()
+    finally:
+        logging.info("Draining webhook server")
+        state["draining"] = True
+        server.stop()
+        try:
+            await asyncio.wait_for(server.close_all_connections(), drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Timed out waiting for open webhook connections")
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)